@@ -1,16 +1,69 @@
+import eventlet
+eventlet.monkey_patch()  # Make sockets and threads cooperative before anything else imports them
+
 from flask import Flask, request, jsonify, send_file, send_from_directory
-from clickhouse_client import ClickHouseClient
+from flask.json.provider import JSONProvider
+from clickhouse_client import checkout_client
 from file_handler import FileHandler
 from ingestion import ingest_clickhouse_to_file, ingest_file_to_clickhouse
+from utils import configure_logging
 from flask_cors import CORS
 from flask_socketio import SocketIO
+from decimal import Decimal
+import datetime
+import json
+import orjson
 import os
-import threading
-import eventlet
+import uuid
+
+def orjson_default(obj):
+    # orjson handles datetimes and UUIDs natively; ClickHouse Decimals become strings
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def stdlib_default(obj):
+    # The stdlib encoder lacks orjson's native types; format them the same way
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    return orjson_default(obj)
+
+def dump_json(obj, option=0):
+    try:
+        return orjson.dumps(obj, default=orjson_default, option=option)
+    except orjson.JSONEncodeError:
+        # orjson rejects integers wider than 64 bits, such as ClickHouse
+        # Int128 and UInt256 values, without calling default
+        return json.dumps(obj, default=stdlib_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider using orjson, which is much faster than the stdlib on wide previews"""
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return dump_json(obj, self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            dump_json(obj, self.option),
+            mimetype="application/json"
+        )
+
+configure_logging()
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+
+# Ensure data directory exists (also when served by gunicorn)
+os.makedirs('data', exist_ok=True)
 
 # Global variable to track progress
 progress_data = {
@@ -32,7 +85,11 @@ def update_progress(current, total, status="processing"):
     progress_data["current"] = current
     progress_data["total"] = total
     progress_data["status"] = status
+    
+    # The ingestion functions rate-limit their reports, so every one is emitted
     socketio.emit('progress_update', progress_data)
+    # Yield to the event loop so other requests are served during ingestion
+    socketio.sleep(0)
 
 # Serve frontend files
 @app.route('/')
@@ -55,8 +112,8 @@ def connect_clickhouse():
     data = request.json
     try:
         app.logger.info(f"Connecting to ClickHouse with: host={data['host']}, port={data['port']}, db={data['database']}, user={data['user']}")
-        client = ClickHouseClient(**data)
-        tables = client.get_tables()
+        with checkout_client(data) as client:
+            tables = client.get_tables()
         return jsonify({"status": "success", "tables": tables})
     except Exception as e:
         app.logger.error(f"ClickHouse connection error: {str(e)}")
@@ -68,8 +125,8 @@ def get_columns():
     try:
         if data['source'] == 'clickhouse':
             app.logger.info(f"Getting columns for ClickHouse table: {data.get('table', 'No table specified')}")
-            client = ClickHouseClient(**data['conn'])
-            columns = client.get_columns(data['table'])
+            with checkout_client(data['conn']) as client:
+                columns = client.get_columns(data['table'])
             app.logger.info(f"Successfully retrieved {len(columns)} columns")
             return jsonify({"status": "success", "columns": columns})
         else:
@@ -87,8 +144,8 @@ def preview_data():
     data = request.json
     try:
         if data['source'] == 'clickhouse':
-            client = ClickHouseClient(**data['conn'])
-            result = client.preview_data(data['table'], data['columns'])
+            with checkout_client(data['conn']) as client:
+                result = client.preview_data(data['table'], data['columns'])
         else:
             handler = FileHandler(data['filepath'], data['delimiter'])
             result = handler.preview_data(data['columns'])
@@ -96,7 +153,7 @@ def preview_data():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
-# Function to handle ingestion in a separate thread with progress reporting
+# Function to handle ingestion as a background task with progress reporting
 def run_ingestion(data):
     try:
         reset_progress()
@@ -119,8 +176,8 @@ def run_ingestion(data):
 def ingest():
     data = request.json
     try:
-        # Start ingestion in a separate thread
-        threading.Thread(target=run_ingestion, args=(data,)).start()
+        # Start ingestion as a background task on the eventlet hub
+        socketio.start_background_task(run_ingestion, data)
         return jsonify({"status": "started"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
@@ -144,6 +201,5 @@ def handle_disconnect():
     app.logger.info('Client disconnected from WebSocket')
 
 if __name__ == '__main__':
-    # Ensure data directory exists
-    os.makedirs('data', exist_ok=True)
-    socketio.run(app, debug=True, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    # Development server; use gunicorn with the eventlet worker in production
+    socketio.run(app, debug=True)
\ No newline at end of file
@@ -1,8 +1,142 @@
 from clickhouse_driver import Client
-import re
+from utils import get_arrow
+import contextlib
+import functools
+import gzip
+import io
+import json
+import os
+import string
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from itertools import islice
+
+# Seconds that table and column lists stay cached
+METADATA_TTL = 300
+METADATA_CACHE_SIZE = 1024
+
+# Bytes per read/send when streaming files to or from the HTTP interface;
+# http.client would otherwise move request bodies in 8 KiB pieces
+HTTP_CHUNK_SIZE = 1 << 20
+
+# Rows per native protocol block sent by the driver on INSERT
+INSERT_BLOCK_SIZE = 1048576
+
+# gzip level for HTTP request bodies; the fastest level keeps uploads from
+# becoming CPU bound while still shrinking CSV several times
+HTTP_GZIP_LEVEL = 1
+
+# Metadata cache shared by all clients: key -> (expires_at, value)
+_metadata_cache = {}
+_metadata_lock = threading.Lock()
+
+# Translation table deleting every allowed identifier character; a name is
+# valid when nothing is left after translating it
+_STRIP_IDENT_CHARS = str.maketrans('', '', string.ascii_letters + string.digits + '_')
+
+def _is_identifier(name):
+    """
+    Check that a name only contains ASCII letters, digits and underscores
+    
+    Args:
+        name (str): Table or column name
+        
+    Returns:
+        bool: True if valid, False otherwise
+    """
+    return bool(name) and not name.translate(_STRIP_IDENT_CHARS)
+
+def _q(name):
+    """
+    Quote a validated identifier for use in a query
+    
+    Args:
+        name (str): Table or column name
+        
+    Returns:
+        str: Backtick-quoted identifier
+    """
+    return f"`{name}`"
+
+def _validate_table(table):
+    """
+    Validate a table name to prevent SQL injection
+    
+    Args:
+        table (str): Table name
+        
+    Returns:
+        str: Quoted table name
+    """
+    if not _is_identifier(table):
+        raise ValueError("Invalid table name. Only alphanumeric characters and underscores are allowed.")
+    return _q(table)
+
+def _validate_and_quote(columns):
+    """
+    Validate column names to prevent SQL injection
+    
+    Args:
+        columns (list): List of column names
+        
+    Returns:
+        str: Comma-separated list of quoted column names
+    """
+    for col in columns:
+        if not _is_identifier(col):
+            raise ValueError(f"Invalid column name: '{col}'. Only alphanumeric characters and underscores are allowed.")
+    return ', '.join(_q(col) for col in columns)
+
+# Idle connected clients, keyed by connection details; a client is only ever
+# used by one caller at a time, since the driver cannot run two queries on
+# one connection
+_pool = {}
+_pool_lock = threading.Lock()
+
+# Idle clients kept per connection; extra ones are disconnected on return
+POOL_SIZE = 4
+
+@contextlib.contextmanager
+def checkout_client(conn):
+    """
+    Check a ClickHouse client out of the pool for exclusive use
+    
+    Reuses an idle client when one is available, so later calls skip the
+    TCP handshake and connection test, and returns it to the pool on exit.
+    A client whose caller raised is disconnected instead of being reused.
+    
+    Args:
+        conn (dict): Keyword arguments for ClickHouseClient
+        
+    Yields:
+        ClickHouseClient: Connected client, not shared with any other caller
+    """
+    key = tuple(sorted(conn.items()))
+    with _pool_lock:
+        idle = _pool.get(key)
+        client = idle.pop() if idle else None
+    if client is None:
+        client = ClickHouseClient(**conn)
+    try:
+        yield client
+    except BaseException:
+        # The connection may be left mid-query; drop it rather than reuse it
+        client.disconnect()
+        raise
+    with _pool_lock:
+        idle = _pool.setdefault(key, [])
+        if len(idle) < POOL_SIZE:
+            idle.append(client)
+            return
+    client.disconnect()
 
 class ClickHouseClient:
-    def __init__(self, host, port, database, user, jwt_token=None):
+    def __init__(self, host, port, database, user, jwt_token=None, http_port=8123, compression='lz4',
+                 insert_block_size=INSERT_BLOCK_SIZE, http_compression=False):
         """
         Initialize a connection to ClickHouse server
         
@@ -12,6 +146,10 @@ class ClickHouseClient:
             database (str): Database name
             user (str): Username for authentication
             jwt_token (str): JWT token or password for authentication
+            http_port (int): ClickHouse HTTP interface port, used for file uploads
+            compression (str): Native protocol compression ('lz4', 'lz4hc', 'zstd'), or False to disable
+            insert_block_size (int): Maximum rows per block the driver sends on INSERT
+            http_compression (bool): Whether to gzip HTTP interface traffic in both directions
         """
         try:
             self.client = Client(
@@ -19,7 +157,9 @@ class ClickHouseClient:
                 port=port,
                 database=database,
                 user=user,
-                password=jwt_token  # Using password field for both JWT token or regular password
+                password=jwt_token,  # Using password field for both JWT token or regular password
+                compression=compression,
+                settings={'insert_block_size': insert_block_size}
             )
             # Test connection
             self.client.execute("SELECT 1")
@@ -30,11 +170,53 @@ class ClickHouseClient:
                 'port': port,
                 'database': database,
                 'user': user,
-                'jwt_token': jwt_token
+                'jwt_token': jwt_token,
+                'http_port': http_port,
+                'compression': compression,
+                'insert_block_size': insert_block_size,
+                'http_compression': http_compression
             }
         except Exception as e:
             raise ConnectionError(f"Failed to connect to ClickHouse: {str(e)}")
 
+    def disconnect(self):
+        """
+        Close the connection to the ClickHouse server
+        """
+        self.client.disconnect()
+
+    def _cached(self, kind, table, loader):
+        """
+        Return a metadata value from the shared TTL cache, loading it on a miss
+        
+        Args:
+            kind (str): Kind of metadata ('tables' or 'columns')
+            table (str): Table name, or None for database-wide metadata
+            loader (function): Callable that queries the value from ClickHouse
+            
+        Returns:
+            The cached or freshly loaded value
+        """
+        details = self.connection_details
+        key = (details['host'], details['port'], details['database'], details['user'], kind, table)
+        now = time.monotonic()
+        
+        with _metadata_lock:
+            entry = _metadata_cache.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+        
+        value = loader()
+        
+        with _metadata_lock:
+            # Re-insert a refreshed key so it moves to the end of the insertion order
+            _metadata_cache.pop(key, None)
+            if len(_metadata_cache) >= METADATA_CACHE_SIZE:
+                # Evict the oldest entry
+                _metadata_cache.pop(next(iter(_metadata_cache)))
+            _metadata_cache[key] = (now + METADATA_TTL, value)
+        return value
+
     def get_tables(self):
         """
         Get list of tables in the current database
@@ -43,7 +225,7 @@ class ClickHouseClient:
             list: List of table names
         """
         try:
-            return [row[0] for row in self.client.execute("SHOW TABLES")]
+            return self._cached('tables', None, lambda: [row[0] for row in self.client.execute("SHOW TABLES")])
         except Exception as e:
             raise Exception(f"Failed to get tables: {str(e)}")
 
@@ -58,11 +240,10 @@ class ClickHouseClient:
             list: List of column names
         """
         # Sanitize table name to prevent SQL injection
-        if not re.match(r'^[a-zA-Z0-9_]+$', table):
-            raise ValueError("Invalid table name. Only alphanumeric characters and underscores are allowed.")
+        table_sql = _validate_table(table)
             
         try:
-            return [row[0] for row in self.client.execute(f"DESCRIBE TABLE {table}")]
+            return self._cached('columns', table, lambda: [row[0] for row in self.client.execute(f"DESCRIBE TABLE {table_sql}")])
         except Exception as e:
             raise Exception(f"Failed to get columns for table '{table}': {str(e)}")
 
@@ -77,66 +258,64 @@ class ClickHouseClient:
             int: Number of rows in the table
         """
         # Sanitize table name to prevent SQL injection
-        if not re.match(r'^[a-zA-Z0-9_]+$', table):
-            raise ValueError("Invalid table name. Only alphanumeric characters and underscores are allowed.")
+        table_sql = _validate_table(table)
             
         try:
-            result = self.client.execute(f"SELECT count() FROM {table}")
-            return result[0][0]
+            return self.client.execute(f"SELECT count() FROM {table_sql}")[0][0]
         except Exception as e:
             raise Exception(f"Failed to count rows in table '{table}': {str(e)}")
 
-    def fetch_data(self, table, columns):
+    def fetch_data_blocks(self, table, columns, block_size=65536):
         """
-        Fetch data from a table with specified columns
+        Stream data from a table with specified columns as lists of rows
         
         Args:
             table (str): Table name
             columns (list): List of column names
+            block_size (int): Maximum number of rows per block, both as sent by
+                the server and as yielded
             
         Returns:
-            list: List of rows with data
+            iterator: Iterator over lists of rows
         """
         # Sanitize table name and column names
-        if not re.match(r'^[a-zA-Z0-9_]+$', table):
-            raise ValueError("Invalid table name. Only alphanumeric characters and underscores are allowed.")
-            
-        for col in columns:
-            if not re.match(r'^[a-zA-Z0-9_]+$', col):
-                raise ValueError(f"Invalid column name: '{col}'. Only alphanumeric characters and underscores are allowed.")
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
         
         try:
-            query = f"SELECT {', '.join(columns)} FROM {table}"
-            return self.client.execute(query)
+            query = f"SELECT {column_sql} FROM {table_sql}"
+            rows = self.client.execute_iter(query, settings={'max_block_size': block_size})
         except Exception as e:
             raise Exception(f"Failed to fetch data from table '{table}': {str(e)}")
+        
+        # Group rows here rather than with execute_iter's chunk_size, which
+        # yields bare rows instead of one-row lists when it is 1
+        return iter(lambda: list(islice(rows, block_size)), [])
 
-    def insert_data(self, table, columns, data):
+    def insert_data(self, table, columns, data, columnar=False):
         """
         Insert data into a table
         
         Args:
             table (str): Table name
             columns (list): List of column names
-            data (list): List of rows to insert
+            data (list): List of rows to insert, or of columns if columnar
+            columnar (bool): Whether data is a list of columns, which skips the
+                driver's row-to-column transpose
             
         Returns:
             None
         """
         # Sanitize table name and column names
-        if not re.match(r'^[a-zA-Z0-9_]+$', table):
-            raise ValueError("Invalid table name. Only alphanumeric characters and underscores are allowed.")
-            
-        for col in columns:
-            if not re.match(r'^[a-zA-Z0-9_]+$', col):
-                raise ValueError(f"Invalid column name: '{col}'. Only alphanumeric characters and underscores are allowed.")
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
         
         if not data:
             raise ValueError("No data to insert")
             
         try:
-            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES"
-            self.client.execute(query, data)
+            query = f"INSERT INTO {table_sql} ({column_sql}) VALUES"
+            self.client.execute(query, data, columnar=columnar)
         except Exception as e:
             raise Exception(f"Failed to insert data into table '{table}': {str(e)}")
 
@@ -152,16 +331,314 @@ class ClickHouseClient:
             dict: Dictionary with columns and rows
         """
         # Sanitize table name and column names
-        if not re.match(r'^[a-zA-Z0-9_]+$', table):
-            raise ValueError("Invalid table name. Only alphanumeric characters and underscores are allowed.")
-            
-        for col in columns:
-            if not re.match(r'^[a-zA-Z0-9_]+$', col):
-                raise ValueError(f"Invalid column name: '{col}'. Only alphanumeric characters and underscores are allowed.")
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
         
         try:
-            query = f"SELECT {', '.join(columns)} FROM {table} LIMIT 100"
+            query = f"SELECT {column_sql} FROM {table_sql} LIMIT 100"
             result = self.client.execute(query)
             return {"columns": columns, "rows": result}
         except Exception as e:
-            raise Exception(f"Failed to preview data from table '{table}': {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to preview data from table '{table}': {str(e)}")
+
+    def insert_file_http(self, table, columns, filepath, delimiter=','):
+        """
+        Stream a CSV file to the ClickHouse HTTP interface and let the server parse it
+        
+        The file must have a header row; columns are matched by name and any
+        file columns not listed are skipped.
+        
+        Args:
+            table (str): Table name
+            columns (list): List of column names
+            filepath (str): Path to the local CSV file
+            delimiter (str): CSV delimiter character
+            
+        Returns:
+            int: Number of rows inserted
+        """
+        # Sanitize table name and column names
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
+        
+        try:
+            with open(filepath, 'rb') as f:
+                return self._http_insert(
+                    f"INSERT INTO {table_sql} ({column_sql}) FORMAT CSVWithNames",
+                    iter(functools.partial(f.read, HTTP_CHUNK_SIZE), b''),
+                    settings={
+                        'format_csv_delimiter': delimiter,
+                        'input_format_skip_unknown_fields': 1
+                    },
+                    content_length=os.path.getsize(filepath)
+                )
+        except Exception as e:
+            raise Exception(f"Failed to insert file into table '{table}': {str(e)}")
+
+    def insert_arrow(self, table, columns, batches):
+        """
+        Insert Arrow record batches through the HTTP interface in columnar form
+        
+        Batches are serialized as an Arrow IPC stream and sent with chunked
+        transfer encoding, so ClickHouse receives columnar data without any
+        per-row conversion in Python.
+        
+        Args:
+            table (str): Table name
+            columns (list): List of column names, matching the batch columns
+            batches (iterable): pyarrow.RecordBatch objects to insert
+            
+        Returns:
+            int: Number of rows inserted
+        """
+        if get_arrow() is None:
+            raise RuntimeError("pyarrow is required for Arrow inserts")
+        
+        # Sanitize table name and column names
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
+        
+        try:
+            return self._http_insert(
+                f"INSERT INTO {table_sql} ({column_sql}) FORMAT ArrowStream",
+                _arrow_stream_chunks(batches)
+            )
+        except Exception as e:
+            raise Exception(f"Failed to insert data into table '{table}': {str(e)}")
+
+    def _http_open(self, query, body=None, settings=None, content_length=None):
+        """
+        Send a query to the ClickHouse HTTP interface
+        
+        With http_compression enabled, the body is gzipped on the fly and the
+        server is asked to gzip its response; callers reading the response
+        body check its Content-Encoding.
+        
+        Args:
+            query (str): Query to run; INSERT queries end with a FORMAT clause
+            body (iterable): Data for INSERT queries as chunks of bytes; sent chunked
+                unless content_length is given
+            settings (dict): ClickHouse settings for the query
+            content_length (int): Body size in bytes, if known
+            
+        Returns:
+            http.client.HTTPResponse: Open response, to be used as a context manager
+        """
+        details = self.connection_details
+        compress = details['http_compression']
+        settings = dict(settings or {})
+        if compress:
+            settings['enable_http_compression'] = 1
+        params = urllib.parse.urlencode({
+            'query': query,
+            'database': details['database'],
+            **settings
+        })
+        url = f"http://{details['host']}:{details['http_port']}/?{params}"
+        
+        headers = {
+            'X-ClickHouse-User': details['user'],
+            'X-ClickHouse-Key': details['jwt_token'] or ''
+        }
+        if compress:
+            headers['Accept-Encoding'] = 'gzip'
+            if body is not None:
+                headers['Content-Encoding'] = 'gzip'
+                body = _gzip_chunks(body)
+                # The compressed size is not known up front
+                content_length = None
+        if content_length is not None:
+            headers['Content-Length'] = str(content_length)
+        
+        request = urllib.request.Request(url, data=body, method='POST' if body is not None else 'GET', headers=headers)
+        try:
+            return urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            # Surface the server's error message rather than just the status
+            raise Exception(e.read().decode('utf-8', 'replace').strip())
+
+    def _http_insert(self, query, body, settings=None, content_length=None):
+        """
+        Send an INSERT query with its data as the body of an HTTP request
+        
+        Args:
+            query (str): INSERT query ending with a FORMAT clause
+            body (file or iterable): Request body; iterables are sent chunked
+            settings (dict): ClickHouse settings for the query
+            content_length (int): Body size in bytes, if known
+            
+        Returns:
+            int: Number of rows written, as reported by the server
+        """
+        with self._http_open(query, body, settings, content_length) as response:
+            summary = json.loads(response.headers.get('X-ClickHouse-Summary', '{}'))
+        return int(summary.get('written_rows', 0))
+
+    def insert_file_server(self, table, columns, filepath, delimiter=','):
+        """
+        Load a CSV file that is readable by the ClickHouse server itself
+        
+        The path is resolved by the server, relative to its user_files_path,
+        and the file must have a header row.
+        
+        Args:
+            table (str): Table name
+            columns (list): List of column names
+            filepath (str): Path to the CSV file on the server
+            delimiter (str): CSV delimiter character
+            
+        Returns:
+            int: Number of rows inserted
+        """
+        # Sanitize table name and column names
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
+        
+        # Escape the path for use as a string literal
+        path = filepath.replace('\\', '\\\\').replace("'", "\\'")
+        
+        try:
+            query = f"INSERT INTO {table_sql} ({column_sql}) SELECT {column_sql} FROM file('{path}', 'CSVWithNames')"
+            self.client.execute(query, settings={'format_csv_delimiter': delimiter})
+            return self.client.last_query.progress.written_rows
+        except Exception as e:
+            raise Exception(f"Failed to insert file into table '{table}': {str(e)}")
+
+    def export_file_http(self, table, columns, filepath, delimiter=','):
+        """
+        Export a table to a local CSV file, letting the server encode the CSV
+        
+        The result is streamed from the HTTP interface straight into the file,
+        so no rows pass through Python; rows are counted from the line breaks
+        copied, as the server only knows the final count once the whole
+        result has been sent.
+        
+        Args:
+            table (str): Table name
+            columns (list): List of column names
+            filepath (str): Path to the local CSV file to write
+            delimiter (str): CSV delimiter character
+            
+        Returns:
+            int: Number of rows exported
+        """
+        # Sanitize table name and column names
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
+        
+        try:
+            query = f"SELECT {column_sql} FROM {table_sql} FORMAT CSVWithNames"
+            with self._http_open(query, settings={'format_csv_delimiter': delimiter}) as response:
+                source = response
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    source = gzip.GzipFile(fileobj=response)
+                with open(filepath, 'wb') as f:
+                    records = _copy_csv(source, f)
+            # The first record is the header row
+            return max(records - 1, 0)
+        except Exception as e:
+            raise Exception(f"Failed to export data from table '{table}': {str(e)}")
+
+    def export_file_server(self, table, columns, filepath, delimiter=','):
+        """
+        Export a table to a CSV file written by the ClickHouse server itself
+        
+        The path is resolved by the server, relative to its user_files_path.
+        
+        Args:
+            table (str): Table name
+            columns (list): List of column names
+            filepath (str): Path to the CSV file on the server
+            delimiter (str): CSV delimiter character
+            
+        Returns:
+            int: Number of rows exported
+        """
+        # Sanitize table name and column names
+        table_sql = _validate_table(table)
+        column_sql = _validate_and_quote(columns)
+        
+        # Escape the path for use as a string literal
+        path = filepath.replace('\\', '\\\\').replace("'", "\\'")
+        
+        try:
+            query = f"INSERT INTO FUNCTION file('{path}', 'CSVWithNames') SELECT {column_sql} FROM {table_sql}"
+            settings = {
+                'format_csv_delimiter': delimiter,
+                # Replace an existing file instead of failing or appending to it
+                'engine_file_truncate_on_insert': 1
+            }
+            self.client.execute(query, settings=settings)
+            return self.client.last_query.progress.written_rows
+        except Exception as e:
+            raise Exception(f"Failed to export data from table '{table}': {str(e)}")
+
+def _arrow_stream_chunks(batches):
+    """
+    Serialize record batches as an Arrow IPC stream, one chunk per batch
+    
+    Args:
+        batches (iterable): pyarrow.RecordBatch objects sharing one schema
+        
+    Yields:
+        bytes: Consecutive pieces of the IPC stream
+    """
+    buffer = io.BytesIO()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = get_arrow().ipc.new_stream(buffer, batch.schema)
+        writer.write_batch(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if writer is not None:
+        writer.close()
+        yield buffer.getvalue()
+
+def _gzip_chunks(chunks):
+    """
+    Compress a stream of byte chunks into a single gzip stream
+    
+    Args:
+        chunks (iterable): Consecutive pieces of the uncompressed body
+        
+    Yields:
+        bytes: Consecutive pieces of the gzip stream
+    """
+    compressor = zlib.compressobj(HTTP_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def _copy_csv(source, f):
+    """
+    Copy CSV data between binary files, counting the records copied
+    
+    Line breaks inside quoted fields are not counted; a quote inside a field
+    is doubled, so it never changes whether a line break is quoted.
+    
+    Args:
+        source (file): Binary file to read the CSV data from
+        f (file): Binary file to write it to
+        
+    Returns:
+        int: Number of newline-terminated records
+    """
+    records = 0
+    quoted = False
+    while True:
+        chunk = source.read(HTTP_CHUNK_SIZE)
+        if not chunk:
+            return records
+        f.write(chunk)
+        if b'"' not in chunk:
+            if not quoted:
+                records += chunk.count(b'\n')
+            continue
+        # Pieces between quotes alternate between outside and inside a field
+        pieces = chunk.split(b'"')
+        records += sum(piece.count(b'\n') for piece in pieces[quoted::2])
+        quoted = (quoted + len(pieces) - 1) % 2 == 1
@@ -1,5 +1,19 @@
 import csv
+import io
 import os
+from itertools import islice
+from operator import itemgetter
+from utils import get_arrow
+
+# Bytes of CSV text parsed per Arrow block; large blocks give Arrow's
+# thread pool enough rows to parse and convert in parallel
+ARROW_BLOCK_SIZE = 64 << 20
+
+# Rows per record batch built from csv module rows when Arrow falls back
+FALLBACK_BATCH_ROWS = 65536
+
+# Bytes buffered before each write() syscall when writing CSV output
+WRITE_BUFFER_SIZE = 1 << 20
 
 class FileHandler:
     def __init__(self, filepath, delimiter):
@@ -12,6 +26,53 @@ class FileHandler:
         """
         self.filepath = filepath
         self.delimiter = delimiter or ','  # Default to comma if not provided
+        
+        # Underlying binary file of the current reader, used to track progress
+        self._fileobj = None
+        self._total_bytes = 0
+
+    def _open_binary(self, native=False):
+        """
+        Open the CSV file in binary mode and remember it for progress tracking
+        
+        Args:
+            native (bool): Open an Arrow OSFile, which PyArrow reads without
+                going through Python file calls
+        
+        Returns:
+            file: Binary file object
+        """
+        self._total_bytes = os.path.getsize(self.filepath)
+        self._fileobj = get_arrow().OSFile(self.filepath, 'rb') if native else open(self.filepath, 'rb')
+        return self._fileobj
+
+    @property
+    def arrow_supported(self):
+        """
+        Whether the file can be parsed with PyArrow's CSV reader
+        
+        PyArrow needs to be installed and the delimiter must be a single byte.
+        
+        Returns:
+            bool: True if the Arrow readers can be used
+        """
+        return get_arrow() is not None and len(self.delimiter.encode('utf-8')) == 1
+
+    def read_progress(self):
+        """
+        Get the fraction of the file consumed by the current reader
+        
+        Based on the byte offset of the underlying file, so no extra pass over
+        the file is needed to count rows.
+        
+        Returns:
+            float: Fraction between 0.0 and 1.0
+        """
+        if self._fileobj is None or not self._total_bytes:
+            return 0.0
+        if self._fileobj.closed:
+            return 1.0
+        return min(1.0, self._fileobj.tell() / self._total_bytes)
 
     def get_columns(self):
         """
@@ -21,7 +82,7 @@ class FileHandler:
             list: List of column names
         """
         try:
-            with open(self.filepath, newline='', encoding='utf-8') as f:
+            with open(self.filepath, newline='', encoding='utf-8-sig') as f:
                 reader = csv.reader(f, delimiter=self.delimiter)
                 return next(reader)
         except FileNotFoundError:
@@ -29,74 +90,304 @@ class FileHandler:
         except Exception as e:
             raise Exception(f"Error reading file: {str(e)}")
 
-    def read_data(self, selected_columns, progress_callback=None):
+    @staticmethod
+    def _column_getter(header, selected_columns):
         """
-        Read data from the CSV file for selected columns
+        Build a callable projecting a CSV row onto the selected columns
         
         Args:
-            selected_columns (list): List of column names to read
-            progress_callback (function): Callback function to report progress
+            header (list): Column names from the CSV header row
+            selected_columns (list): List of column names to project
+            
+        Returns:
+            function: Callable returning a tuple of the selected values
+        """
+        missing = [col for col in selected_columns if col not in header]
+        if missing:
+            raise ValueError(f"Columns not found in file: {', '.join(missing)}")
+        
+        col_indices = [header.index(col) for col in selected_columns]
+        if len(col_indices) < 2:
+            # itemgetter needs two or more indices to return a tuple
+            return lambda row: tuple(row[i] for i in col_indices)
+        return itemgetter(*col_indices)
+
+    @staticmethod
+    def _selected_width(header, selected_columns):
+        """
+        Get the number of fields a row needs to hold every selected column
+        
+        Args:
+            header (list): Column names from the CSV header row
+            selected_columns (list): List of column names to project
             
         Returns:
-            list: List of rows with data for selected columns
+            int: One past the position of the last selected column
+        """
+        return max((header.index(col) + 1 for col in selected_columns), default=0)
+
+    def iter_rows(self, selected_columns):
+        """
+        Lazily read rows from the CSV file for selected columns
+        
+        Args:
+            selected_columns (list): List of column names to read
+            
+        Yields:
+            tuple: Row values for the selected columns
         """
         try:
-            # First pass to count rows for progress reporting
-            with open(self.filepath, newline='', encoding='utf-8') as f:
-                row_count = sum(1 for _ in f) - 1  # Subtract header row
+            if self.arrow_supported:
+                yield from self._iter_arrow_rows(selected_columns)
+            else:
+                yield from self._iter_csv_rows(selected_columns)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File not found: {self.filepath}")
+        except Exception as e:
+            raise Exception(f"Error reading data: {str(e)}")
+
+    def _iter_csv_rows(self, selected_columns, first_row=2):
+        """
+        Read rows for selected columns with the csv module
+        
+        Rows are numbered like PyArrow numbers them: the header is row 1 and
+        blank lines are not rows.
+        
+        Args:
+            selected_columns (list): List of column names to read
+            first_row (int): Number of the first row to read
             
-            if progress_callback:
-                progress_callback(15, 100, "counting_rows")
+        Yields:
+            tuple: Row values for the selected columns
+        """
+        with io.TextIOWrapper(self._open_binary(), encoding='utf-8-sig', newline='') as f:
+            rows = filter(None, csv.reader(f, delimiter=self.delimiter))
+            header = next(rows, None)
+            if header is None:
+                # An empty file has no header and no rows
+                return
+            getter = self._column_getter(header, selected_columns)
+            width = self._selected_width(header, selected_columns)
             
-            with open(self.filepath, newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f, delimiter=self.delimiter)
-                data = []
-                rows_processed = 0
-                
-                for row in reader:
-                    try:
-                        data.append([row[col] for col in selected_columns])
-                    except KeyError:
-                        # Skip rows with missing columns
-                        continue
-                    
-                    rows_processed += 1
-                    if progress_callback and row_count > 0 and rows_processed % (max(1, row_count // 100)) == 0:
-                        progress_pct = min(59, 15 + (rows_processed / row_count) * 45)
-                        progress_callback(int(progress_pct), 100, "reading_data")
-                
-                return data
+            for number, row in enumerate(rows, 2):
+                # Skip rows missing a selected column, like the Arrow reader
+                if number >= first_row and len(row) >= width:
+                    yield getter(row)
+
+    def _iter_arrow_rows(self, selected_columns):
+        """
+        Read rows for selected columns using PyArrow's multithreaded CSV parser
+        
+        Columns are projected during parsing and kept as strings, so rows
+        match what the csv module would produce.
+        
+        Args:
+            selected_columns (list): List of column names to read
+            
+        Yields:
+            tuple: Row values for the selected columns
+        """
+        for batch in self._iter_string_batches(selected_columns):
+            yield from zip(*[column.to_pylist() for column in batch.columns])
+
+    def iter_tables(self, selected_columns, rows):
+        """
+        Read the selected columns as string-typed Arrow tables of a fixed row count
+        
+        Args:
+            selected_columns (list): List of column names to read
+            rows (int): Number of rows per table; the last table may be shorter
+            
+        Yields:
+            pyarrow.Table: Consecutive slices of the file
+        """
+        if not self.arrow_supported:
+            raise RuntimeError("pyarrow and a single-byte delimiter are required to read Arrow tables")
+        pa = get_arrow()
+        
+        try:
+            pending = None
+            for batch in self._iter_string_batches(selected_columns):
+                # Slicing and concatenating tables is zero-copy
+                table = pa.Table.from_batches([batch])
+                pending = table if pending is None else pa.concat_tables([pending, table])
+                while pending.num_rows >= rows:
+                    yield pending.slice(0, rows)
+                    pending = pending.slice(rows)
+            if pending is not None and pending.num_rows:
+                yield pending
         except FileNotFoundError:
             raise FileNotFoundError(f"File not found: {self.filepath}")
         except Exception as e:
             raise Exception(f"Error reading data: {str(e)}")
 
-    def write_data(self, columns, data):
+    def _iter_string_batches(self, selected_columns):
         """
-        Write data to CSV file
+        Read the selected columns as string-typed Arrow record batches
+        
+        Arrow cannot keep rows with more fields than the header, or short
+        rows that still hold every selected column, which the csv module
+        reads fine; on the first such row the rest of the file is read with
+        the csv module instead, resuming at the row after the last one Arrow
+        produced, so both give the same rows.
         
         Args:
-            columns (list): List of column names
-            data (list): List of rows to write
+            selected_columns (list): List of column names to read
+            
+        Yields:
+            pyarrow.RecordBatch: Consecutive batches of the file
+        """
+        pa = get_arrow()
+        if not os.path.getsize(self.filepath):
+            # An empty file has no header and no rows
+            return
+        
+        skipped_rows = []
+        fallback_rows = []
+        rows_read = 0
+        try:
+            with self._open_binary(native=True) as f:
+                for batch in self._open_string_reader(f, selected_columns, skipped_rows, fallback_rows):
+                    yield batch
+                    rows_read += batch.num_rows
+            return
+        except pa.ArrowInvalid:
+            if not fallback_rows or min(skipped_rows + fallback_rows) < 0:
+                # Not a ragged row, or Arrow could not tell which rows it skipped
+                raise
+        
+        # Find the number of the last row produced: the header, the rows read,
+        # and every skipped row up to there; the parser may have skipped rows
+        # further ahead that were never produced
+        last_row = 1 + rows_read
+        for number in sorted(skipped_rows):
+            if number > last_row:
+                break
+            last_row += 1
+        
+        rows = self._iter_csv_rows(selected_columns, first_row=last_row + 1)
+        schema = pa.schema([(col, pa.string()) for col in selected_columns])
+        while True:
+            chunk = list(islice(rows, FALLBACK_BATCH_ROWS))
+            if not chunk:
+                return
+            yield pa.RecordBatch.from_arrays([pa.array(values, pa.string()) for values in zip(*chunk)], schema=schema)
+
+    def _open_string_reader(self, f, selected_columns, skipped_rows, fallback_rows):
+        """
+        Open a streaming PyArrow CSV reader that keeps every selected column as strings
+        
+        Args:
+            f (file): Binary file object positioned at the header row
+            selected_columns (list): List of column names to read
+            skipped_rows (list): Receives the numbers of rows skipped for
+                missing a selected column
+            fallback_rows (list): Receives the number of a row with more or
+                fewer fields than the header but every selected column, after
+                which the reader raises ArrowInvalid
             
         Returns:
-            None
+            pyarrow.csv.CSVStreamingReader: Reader yielding record batches
         """
-        # Ensure directory exists
-        directory = os.path.dirname(self.filepath)
-        if directory:
-            os.makedirs(directory, exist_ok=True)
+        pa = get_arrow()
+        width = self._selected_width(self.get_columns(), selected_columns)
+        
+        def handle_invalid_row(row):
+            # Skip rows missing a selected column, like the csv module path
+            if row.actual_columns < width:
+                skipped_rows.append(row.number)
+                return 'skip'
+            fallback_rows.append(row.number)
+            return 'error'
+        
+        return pa.csv.open_csv(
+            f,
+            read_options=pa.csv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE),
+            parse_options=pa.csv.ParseOptions(
+                delimiter=self.delimiter,
+                newlines_in_values=True,
+                invalid_row_handler=handle_invalid_row
+            ),
+            convert_options=pa.csv.ConvertOptions(
+                include_columns=selected_columns,
+                column_types={col: pa.string() for col in selected_columns}
+            )
+        )
+
+    def iter_record_batches(self, selected_columns):
+        """
+        Read the selected columns as string-typed Arrow record batches
+        
+        Values are sent as written in the file and ClickHouse casts them to
+        the column types, so no type is guessed from a single block. Empty
+        fields become nulls, which ClickHouse inserts as column defaults the
+        way it treats empty CSV fields.
+        
+        Args:
+            selected_columns (list): List of column names to read
+            
+        Yields:
+            pyarrow.RecordBatch: Columnar batches of the file, in order
+        """
+        if not self.arrow_supported:
+            raise RuntimeError("pyarrow and a single-byte delimiter are required to read record batches")
+        pa = get_arrow()
+        pc = pa.compute
         
         try:
-            with open(self.filepath, 'w', newline='', encoding='utf-8') as f:
+            for batch in self._iter_string_batches(selected_columns):
+                yield pa.RecordBatch.from_arrays(
+                    [pc.if_else(pc.equal(column, ''), None, column) for column in batch.columns],
+                    schema=batch.schema
+                )
+        except FileNotFoundError:
+            raise FileNotFoundError(f"File not found: {self.filepath}")
+        except Exception as e:
+            raise Exception(f"Error reading data: {str(e)}")
+
+    def write_blocks(self, columns, blocks):
+        """
+        Write blocks of rows to CSV file through a single writer
+        
+        Each block is handed to csv.writer.writerows, which loops over the
+        rows in C rather than once per row in Python.
+        
+        Args:
+            columns (list): List of column names
+            blocks (iterable): Lists of rows to write, consumed lazily
+            
+        Returns:
+            int: Number of rows written
+        """
+        try:
+            with self._open_text_writer() as f:
                 writer = csv.writer(f, delimiter=self.delimiter)
                 writer.writerow(columns)
-                writer.writerows(data)
+                count = 0
+                for block in blocks:
+                    writer.writerows(block)
+                    count += len(block)
+                return count
         except PermissionError:
             raise PermissionError(f"Permission denied writing to file: {self.filepath}")
         except Exception as e:
             raise Exception(f"Error writing data: {str(e)}")
 
+    def _open_text_writer(self):
+        """
+        Open the file for writing CSV text through a large write buffer
+        
+        Returns:
+            io.TextIOWrapper: Text stream to be used as a context manager
+        """
+        # Ensure directory exists
+        directory = os.path.dirname(self.filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        raw = open(self.filepath, 'wb', buffering=WRITE_BUFFER_SIZE)
+        return io.TextIOWrapper(raw, encoding='utf-8', newline='', write_through=False)
+
     def preview_data(self, selected_columns):
         """
         Preview data from the CSV file for selected columns (limited to 100 rows)
@@ -108,7 +399,7 @@ class FileHandler:
             dict: Dictionary with columns and rows
         """
         try:
-            rows = self.read_data(selected_columns)[:100]
+            rows = list(islice(self.iter_rows(selected_columns), 100))
             return {"columns": selected_columns, "rows": rows}
         except Exception as e:
             raise Exception(f"Error previewing data: {str(e)}")
\ No newline at end of file
@@ -1,14 +1,84 @@
-from clickhouse_client import ClickHouseClient
+from clickhouse_client import checkout_client
 from file_handler import FileHandler
+from utils import get_arrow
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+import contextlib
+import functools
 import os
+import threading
 import time
 import datetime
 import re
 
+# Rows per INSERT, matching ClickHouse's native block size
+BATCH_SIZE = 65536
+
+# Parallel INSERT connections used for file to ClickHouse ingestion
+INSERT_WORKERS = 4
+
+# Minimum seconds between progress reports while the status stays the same
+PROGRESS_INTERVAL = 0.1
+
+# Numeric columns of the ontime schema; empty or invalid values become 0
+ONTIME_NUMERIC_COLUMNS = (
+    'Year', 'Quarter', 'Month', 'DayofMonth', 'DayOfWeek',
+    'DOT_ID_Reporting_Airline', 'OriginAirportID', 'OriginAirportSeqID',
+    'OriginCityMarketID', 'OriginWac', 'DestAirportID', 'DestAirportSeqID',
+    'DestCityMarketID', 'DestWac', 'CRSDepTime', 'DepTime',
+    'DepDelay', 'DepDelayMinutes', 'DepDel15', 'TaxiIn', 'TaxiOut',
+    'CRSArrTime', 'ArrTime', 'ArrDelay', 'ArrDelayMinutes', 'ArrDel15',
+    'Cancelled', 'Diverted', 'CRSElapsedTime', 'ActualElapsedTime',
+    'AirTime', 'Flights', 'Distance', 'DistanceGroup'
+)
+
+# Ontime columns that may hold decimals and are truncated to integers
+ONTIME_FLOAT_COLUMNS = ('DepDelay', 'ArrDelay', 'Cancelled', 'Diverted')
+
+# Enum values of the uk_price_paid schema
+UK_TYPE_MAP = {
+    'terraced': 1,
+    'semi-detached': 2,
+    'detached': 3,
+    'flat': 4,
+    'other': 0
+}
+UK_DURATION_MAP = {
+    'freehold': 1,
+    'leasehold': 2,
+    'unknown': 0
+}
+
+# Date formats accepted for uk_price_paid and generic date columns, in order
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d']
+
+# Strings the Arrow casts may convert in bulk; anything else (hex, spaces,
+# nan, ...) is left to the row processors so both paths agree
+ARROW_INT_PATTERN = r'^[+-]?[0-9]+$'
+ARROW_FLOAT_PATTERN = r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+
+# Generic columns whose names look numeric are converted to integers
+NUMERIC_COLUMN_RE = re.compile(r'^(id|count|num|amount|price|total|sum|qty|quantity)', re.IGNORECASE)
+
+# Column kinds, resolved once per column list and used to dispatch conversions
+KIND_STR = 0
+KIND_DATE = 1
+KIND_INT = 2
+KIND_FLOAT_INT = 3
+KIND_TYPE = 4
+KIND_DURATION = 5
+KIND_FLAG = 6
+KIND_POSTCODE = 7
+
 def ingest_clickhouse_to_file(config, progress_callback=None):
     """
     Transfer data from ClickHouse to a CSV file
     
+    By default rows are streamed through Python and written with the csv
+    module. Setting config['transfer_mode'] to 'http' streams CSV encoded
+    by the server into the file instead, and 'server' has the ClickHouse
+    server write the file itself.
+    
     Args:
         config (dict): Configuration with connection details, table, columns, filepath, and delimiter
         progress_callback (function): Callback function to report progress
@@ -16,40 +86,48 @@ def ingest_clickhouse_to_file(config, progress_callback=None):
     Returns:
         int: Number of records transferred
     """
+    if progress_callback:
+        progress_callback = throttled(progress_callback)
+    
     try:
+        transfer_mode = config.get('transfer_mode', 'python')
+        batch_size = batch_size_of(config)
+        
         if progress_callback:
             progress_callback(10, 100, "connecting")
         
         # Connect to ClickHouse
-        client = ClickHouseClient(**config['conn'])
-        
-        if progress_callback:
-            progress_callback(20, 100, "fetching_metadata")
+        with checkout_client(config['conn']) as client:
+            if transfer_mode in ('http', 'server'):
+                if progress_callback:
+                    progress_callback(30, 100, "exporting_data")
+                
+                if transfer_mode == 'http':
+                    os.makedirs(os.path.dirname(os.path.abspath(config['filepath'])), exist_ok=True)
+                    count = client.export_file_http(config['table'], config['columns'], config['filepath'], config['delimiter'] or ',')
+                else:
+                    count = client.export_file_server(config['table'], config['columns'], config['filepath'], config['delimiter'] or ',')
+                
+                if progress_callback:
+                    progress_callback(95, 100, "finalizing")
+                return count
             
-        # Get total row count for progress calculation
-        total_count = client.count_rows(config['table'])
-        
-        if progress_callback:
-            progress_callback(30, 100, "fetching_data")
-        
-        # Fetch data from ClickHouse
-        data = client.fetch_data(config['table'], config['columns'])
-        
-        if progress_callback:
-            progress_callback(70, 100, "writing_file")
-        
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(os.path.abspath(config['filepath'])), exist_ok=True)
-        
-        # Write data to file
-        handler = FileHandler(config['filepath'], config['delimiter'])
-        handler.write_data(config['columns'], data)
-        
-        if progress_callback:
-            progress_callback(95, 100, "finalizing")
-            time.sleep(0.5)  # Small delay to show progress completion
-        
-        return len(data)
+            if progress_callback:
+                progress_callback(30, 100, "exporting_data")
+            
+            # Ensure the directory exists
+            os.makedirs(os.path.dirname(os.path.abspath(config['filepath'])), exist_ok=True)
+            
+            # Stream rows from ClickHouse straight into the file, block by block,
+            # so the full result set is never held in memory
+            blocks = client.fetch_data_blocks(config['table'], config['columns'], batch_size)
+            handler = FileHandler(config['filepath'], config['delimiter'] or ',')
+            count = handler.write_blocks(config['columns'], blocks)
+            
+            if progress_callback:
+                progress_callback(95, 100, "finalizing")
+            
+            return count
     except Exception as e:
         if progress_callback:
             progress_callback(0, 100, "error")
@@ -59,6 +137,13 @@ def ingest_file_to_clickhouse(config, progress_callback=None):
     """
     Transfer data from a CSV file to ClickHouse
     
+    By default rows are parsed and type-converted in Python. Setting
+    config['transfer_mode'] to 'http' uploads the file to the ClickHouse
+    HTTP interface instead, 'server' loads a file that the ClickHouse
+    server can read itself, and 'arrow' parses the file with PyArrow and
+    sends it as columnar Arrow batches; all three skip the Python-side
+    row conversion and leave type conversion to the server.
+    
     Args:
         config (dict): Configuration with connection details, table, columns, filepath, and delimiter
         progress_callback (function): Callback function to report progress
@@ -66,247 +151,788 @@ def ingest_file_to_clickhouse(config, progress_callback=None):
     Returns:
         int: Number of records transferred
     """
+    if progress_callback:
+        progress_callback = throttled(progress_callback)
+    
     try:
-        if progress_callback:
-            progress_callback(10, 100, "reading_file")
-        
-        # Read data from file
-        handler = FileHandler(config['filepath'], config['delimiter'])
-        data = handler.read_data(config['columns'], progress_callback)
-        
-        if not data:
-            return 0
+        transfer_mode = config.get('transfer_mode', 'python')
+        batch_size = batch_size_of(config)
+        if transfer_mode in ('http', 'server', 'arrow'):
+            return load_file_on_server(config, transfer_mode, progress_callback)
         
         if progress_callback:
-            progress_callback(60, 100, "connecting_to_clickhouse")
-        
-        # Connect to ClickHouse
-        client = ClickHouseClient(**config['conn'])
+            progress_callback(10, 100, "reading_file")
         
-        if progress_callback:
-            progress_callback(70, 100, "preparing_data")
+        # Rows are read lazily; nothing is materialized beyond one batch
+        handler = FileHandler(config['filepath'], config['delimiter'] or ',')
         
         # Identify which table schema to use for type conversion
         table_name = config['table'].lower()
         
-        # Process data types according to the appropriate ClickHouse schema
-        processed_data = []
-        for row in data:
-            processed_row = []
-            
-            # Choose the appropriate data type processor based on the table
-            if "ontime" in table_name:
-                processed_row = process_ontime_row(row, config['columns'])
-            elif "uk_price_paid" in table_name:
-                processed_row = process_uk_price_paid_row(row, config['columns'])
-            else:
-                # Generic processing for unknown tables
-                processed_row = process_generic_row(row, config['columns'])
-            
-            processed_data.append(processed_row)
+        # Resolve the per-column conversions for the table schema once
+        process_row = make_row_processor(table_name, config['columns'])
+        process_batch = process_ontime_batch if "ontime" in table_name else None
         
         if progress_callback:
-            progress_callback(75, 100, "inserting_data")
+            progress_callback(20, 100, "inserting_data")
         
-        # Insert data in batches to show progress
-        batch_size = 1000
-        total_batches = (len(processed_data) + batch_size - 1) // batch_size
+        sort_indices = order_by_indices(config['columns'], config.get('order_by'))
         
-        for i in range(0, len(processed_data), batch_size):
-            batch = processed_data[i:i+batch_size]
-            client.insert_data(config['table'], config['columns'], batch)
-            
-            batch_num = i // batch_size + 1
-            progress = 75 + (20 * batch_num / total_batches)
-            
-            if progress_callback:
-                progress_callback(int(progress), 100, f"inserting_batch_{batch_num}_of_{total_batches}")
+        if handler.arrow_supported:
+            # Convert whole columns with Arrow compute kernels
+            tables = handler.iter_tables(config['columns'], batch_size)
+            converters = arrow_column_converters(config['columns'], table_name)
+            batches = convert_tables(tables, converters, process_row, sort_indices)
+            count = insert_batches_parallel(config, batches, handler, progress_callback)
+        else:
+            rows = handler.iter_rows(config['columns'])
+            if process_batch:
+                batches = (process_batch(batch, config['columns']) for batch in batched(rows, batch_size))
+            else:
+                batches = convert_and_batch(rows, process_row, batch_size)
+            if sort_indices:
+                batches = (sort_columns(batch, sort_indices) for batch in batches)
+            count = insert_batches_parallel(config, batches, handler, progress_callback)
         
         if progress_callback:
             progress_callback(95, 100, "finalizing")
-            time.sleep(0.5)  # Small delay to show progress completion
         
-        return len(processed_data)
+        return count
     except Exception as e:
         if progress_callback:
             progress_callback(0, 100, "error")
         raise Exception(f"Error in file to ClickHouse ingestion: {str(e)}")
 
-def process_ontime_row(row, columns):
+def load_file_on_server(config, transfer_mode, progress_callback=None):
     """
-    Process a row of data for the ontime table schema
+    Have ClickHouse parse and insert a CSV file without Python round-tripping the rows
     
     Args:
-        row (list): The row data
-        columns (list): The column names
+        config (dict): Configuration with connection details, table, columns, filepath, and delimiter
+        transfer_mode (str): 'http' to upload the file, 'server' if the server can read the path,
+            'arrow' to send columnar Arrow batches
+        progress_callback (function): Callback function to report progress
     
     Returns:
-        list: The processed row with correct data types
+        int: Number of records transferred
     """
-    processed_row = []
-    for i, col in enumerate(columns):
-        value = row[i]
+    if progress_callback:
+        progress_callback(10, 100, "connecting_to_clickhouse")
+    
+    with checkout_client(config['conn']) as client:
+        if progress_callback:
+            progress_callback(30, 100, "loading_file")
         
-        # Handle special data types
-        if col == 'FlightDate' and value:
-            # Convert FlightDate string to proper date object if needed
-            try:
-                if isinstance(value, str):
-                    # Try to parse date from string format
-                    value = datetime.datetime.strptime(value, '%Y-%m-%d').date()
-            except ValueError:
-                # Keep original value if parsing fails
-                pass
+        if transfer_mode == 'arrow':
+            handler = FileHandler(config['filepath'], config['delimiter'])
+            batches = handler.iter_record_batches(config['columns'])
+            if progress_callback:
+                batches = report_progress(batches, handler, progress_callback)
+            count = client.insert_arrow(config['table'], config['columns'], batches)
+        elif transfer_mode == 'http':
+            count = client.insert_file_http(config['table'], config['columns'], config['filepath'], config['delimiter'] or ',')
+        else:
+            count = client.insert_file_server(config['table'], config['columns'], config['filepath'], config['delimiter'] or ',')
+    
+    if progress_callback:
+        progress_callback(95, 100, "finalizing")
+    
+    return count
+
+def throttled(progress_callback, interval=PROGRESS_INTERVAL):
+    """
+    Wrap a progress callback so repeated reports of one status are rate-limited
+    
+    A report with a new status always goes through, so stage changes such as
+    "finalizing" or "error" are never dropped.
+    
+    Args:
+        progress_callback (function): Callback function to report progress
+        interval (float): Minimum seconds between reports of the same status
+    
+    Returns:
+        function: The rate-limited callback
+    """
+    last = {"time": 0.0, "status": None}
+    
+    def callback(current, total, status):
+        now = time.monotonic()
+        if status != last["status"] or now - last["time"] >= interval:
+            last["time"] = now
+            last["status"] = status
+            progress_callback(current, total, status)
+    
+    return callback
+
+def insert_batches_parallel(config, batches, handler, progress_callback=None):
+    """
+    Insert batches over several ClickHouse connections in parallel
+    
+    Each worker thread inserts through its own pooled connection, so with OS
+    threads converting the next batch overlaps the network I/O of the
+    previous ones. The reader blocks while max_in_flight batches (twice the
+    workers by default) are queued or being sent, which bounds memory use.
+    
+    Under eventlet's monkey patching, as in the app server, the workers are
+    greenlets and conversion and inserts do not overlap: conversion only
+    gives way between batches, and a worker only sends while conversion
+    waits. Parallel connections still overlap each other's server time.
+    
+    Args:
+        config (dict): Configuration with connection details, table, and columns
+        batches (iterable): Batches of processed data, each a list of column value lists
+        handler (FileHandler): The handler reading the rows, used to measure progress
+        progress_callback (function): Callback function to report progress
+    
+    Returns:
+        int: Number of records inserted
+    """
+    workers = positive_int_of(config, 'insert_workers', INSERT_WORKERS)
+    max_in_flight = positive_int_of(config, 'max_in_flight', workers * 2)
+    local = threading.local()
+    clients = contextlib.ExitStack()
+    clients_lock = threading.Lock()
+    
+    def insert_batch(batch):
+        client = getattr(local, 'client', None)
+        if client is None:
+            # Checked out until every worker is done, then returned to the
+            # pool, or dropped if the ingestion failed
+            with clients_lock:
+                client = local.client = clients.enter_context(checkout_client(config['conn']))
+        # Columnar batches skip the driver's row to column transpose
+        client.insert_data(config['table'], config['columns'], batch, columnar=True)
+        return len(batch[0])
+    
+    def collect(futures):
+        inserted = sum(future.result() for future in futures)
+        if progress_callback:
+            progress_callback(int(20 + handler.read_progress() * 74), 100, "inserting_data")
+        return inserted
+    
+    count = 0
+    in_flight = set()
+    with clients, ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in batches:
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                count += collect(done)
             
-        # Handle numeric fields for ontime table
-        elif col in ('Year', 'Quarter', 'Month', 'DayofMonth', 'DayOfWeek',
-                   'DOT_ID_Reporting_Airline', 'OriginAirportID', 'OriginAirportSeqID', 
-                   'OriginCityMarketID', 'OriginWac', 'DestAirportID', 'DestAirportSeqID',
-                   'DestCityMarketID', 'DestWac', 'CRSDepTime', 'DepTime', 
-                   'DepDelay', 'DepDelayMinutes', 'DepDel15', 'TaxiIn', 'TaxiOut',
-                   'CRSArrTime', 'ArrTime', 'ArrDelay', 'ArrDelayMinutes', 'ArrDel15',
-                   'Cancelled', 'Diverted', 'CRSElapsedTime', 'ActualElapsedTime',
-                   'AirTime', 'Flights', 'Distance', 'DistanceGroup'):
-            try:
-                # Convert numeric fields to appropriate types
-                if value == '':
-                    value = 0  # Default value for empty numeric fields
-                elif col in ('Year', 'Quarter', 'Month', 'DayofMonth', 'DayOfWeek'):
-                    value = int(value)
-                elif col in ('DepDelay', 'ArrDelay', 'Cancelled', 'Diverted'):
-                    value = int(float(value))
-                else:
-                    value = int(value)
-            except (ValueError, TypeError):
-                # Use default value if conversion fails
-                value = 0
+            in_flight.add(executor.submit(insert_batch, batch))
+            # Let a green worker start sending before the next conversion
+            time.sleep(0)
         
-        processed_row.append(value)
+        if in_flight:
+            count += collect(wait(in_flight).done)
+    
+    return count
+
+def convert_and_batch(rows, process_row, batch_size):
+    """
+    Convert rows and group them into columnar batches in a single pass
+    
+    Converted rows go straight into a preallocated batch buffer, which is
+    transposed into columns once it is full.
+    
+    Args:
+        rows (iterable): The raw rows read from the file
+        process_row (function): Row processor from make_row_processor
+        batch_size (int): Rows per batch; the last batch may be shorter
     
-    return processed_row
+    Yields:
+        list: One list of processed values per column
+    """
+    batch = [None] * batch_size
+    filled = 0
+    for row in rows:
+        batch[filled] = process_row(row)
+        filled += 1
+        if filled == batch_size:
+            yield [list(values) for values in zip(*batch)]
+            batch = [None] * batch_size
+            filled = 0
+    if filled:
+        yield [list(values) for values in zip(*batch[:filled])]
 
-def process_uk_price_paid_row(row, columns):
+def batched(items, batch_size):
     """
-    Process a row of data for the uk_price_paid table schema
+    Group items into lists of batch_size, reading only one batch ahead
     
     Args:
-        row (list): The row data
+        items (iterable): The items to group
+        batch_size (int): Items per batch; the last batch may be shorter
+    
+    Yields:
+        list: The batches
+    """
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def report_progress(items, handler, progress_callback):
+    """
+    Pass items through unchanged, reporting read progress after each one
+    
+    Args:
+        items (iterable): The batches being inserted
+        handler (FileHandler): The handler reading the batches, used to measure progress
+        progress_callback (function): Callback function to report progress
+    
+    Yields:
+        The items from the input iterable
+    """
+    for item in items:
+        yield item
+        progress_callback(int(30 + handler.read_progress() * 64), 100, "inserting_data")
+
+@functools.lru_cache(maxsize=64)
+def classify_columns(table_name, columns):
+    """
+    Determine how each column of a table schema is converted
+    
+    Args:
+        table_name (str): Lower-cased target table name
+        columns (tuple): The column names
+    
+    Returns:
+        tuple: One KIND_* value per column
+    """
+    kinds = []
+    for col in columns:
+        kind = KIND_STR
+        if "ontime" in table_name:
+            if col == 'FlightDate':
+                kind = KIND_DATE
+            elif col in ONTIME_FLOAT_COLUMNS:
+                kind = KIND_FLOAT_INT
+            elif col in ONTIME_NUMERIC_COLUMNS:
+                kind = KIND_INT
+        elif "uk_price_paid" in table_name:
+            if col == 'price':
+                kind = KIND_FLOAT_INT
+            elif col == 'date':
+                kind = KIND_DATE
+            elif col == 'type':
+                kind = KIND_TYPE
+            elif col == 'is_new':
+                kind = KIND_FLAG
+            elif col == 'duration':
+                kind = KIND_DURATION
+            elif col in ('postcode1', 'postcode2'):
+                kind = KIND_POSTCODE
+        else:
+            if col.lower().endswith('date'):
+                kind = KIND_DATE
+            elif NUMERIC_COLUMN_RE.match(col):
+                kind = KIND_FLOAT_INT
+        kinds.append(kind)
+    return tuple(kinds)
+
+def process_ontime_batch(rows, columns):
+    """
+    Process a batch of rows for the ontime table schema, one column at a time
+    
+    Each column is converted by a single comprehension, which avoids the
+    per-row function call and per-value dispatch of the row processor. A
+    column containing a value the comprehension rejects is converted value
+    by value with the row processor's converter instead, so the results are
+    the same and the other columns keep the fast path.
+    
+    Args:
+        rows (list): The batch of row data
         columns (list): The column names
     
     Returns:
-        list: The processed row with correct data types
+        list: One list of processed values per column
     """
-    processed_row = []
-    for i, col in enumerate(columns):
-        value = row[i]
-        
-        # Handle specific data types for uk_price_paid table
-        if col == 'price':
-            try:
-                value = int(float(value)) if value else 0
-            except (ValueError, TypeError):
-                value = 0
-                
-        elif col == 'date':
+    kinds = classify_columns('ontime', tuple(columns))
+    converted = []
+    for values, kind in zip(zip(*rows), kinds):
+        try:
+            if kind == KIND_DATE:
+                values = [fast_ymd(v) if v else v for v in values]
+            elif kind == KIND_INT:
+                values = [int(v) if v != '' else 0 for v in values]
+            elif kind == KIND_FLOAT_INT:
+                values = [int(float(v)) if v != '' else 0 for v in values]
+            else:
+                values = list(values)
+        except (ValueError, TypeError, OverflowError):
+            values = list(map(_ONTIME_CONVERTERS[kind], values))
+        converted.append(values)
+    return converted
+
+def make_row_processor(table_name, columns):
+    """
+    Build a row processor with the per-column conversions resolved up front
+    
+    Args:
+        table_name (str): Lower-cased target table name
+        columns (list): The column names
+    
+    Returns:
+        function: Callable converting one row into a processed list
+    """
+    # Each date column remembers the format its own values last matched
+    plan = [
+        (i, _memoized_date() if convert is _date else convert)
+        for i, convert in _conversion_plan(table_name, tuple(columns))
+    ]
+    
+    def process_row(row):
+        return [row[i] if convert is None else convert(row[i]) for i, convert in plan]
+    
+    return process_row
+
+@functools.lru_cache(maxsize=64)
+def _conversion_plan(table_name, columns):
+    """
+    Pair each column position with its value converter
+    
+    Args:
+        table_name (str): Lower-cased target table name
+        columns (tuple): The column names
+    
+    Returns:
+        tuple: (index, converter) pairs; the converter is None for unchanged columns
+    """
+    if "ontime" in table_name:
+        converters = _ONTIME_CONVERTERS
+    elif "uk_price_paid" in table_name:
+        converters = _UK_PRICE_PAID_CONVERTERS
+    else:
+        converters = _GENERIC_CONVERTERS
+    return tuple(
+        (i, converters.get(kind))
+        for i, kind in enumerate(classify_columns(table_name, columns))
+    )
+
+def _ontime_date(value):
+    # Convert FlightDate string to proper date object if needed
+    if value and isinstance(value, str):
+        try:
+            return fast_ymd(value)
+        except ValueError:
+            # Keep original value if parsing fails
+            pass
+    return value
+
+def _date(value):
+    # Try to parse date from string format (supports multiple formats)
+    if value and isinstance(value, str):
+        try:
+            return parse_date(value)[0]
+        except ValueError:
+            # Keep original value if parsing fails
+            pass
+    return value
+
+def _memoized_date():
+    """
+    Build a converter like _date that tries the last matching format first
+    
+    Returns:
+        function: Date converter holding its own last format, for one column
+    """
+    last_format = DATE_FORMATS[0]
+    
+    def convert(value):
+        nonlocal last_format
+        if value and isinstance(value, str):
             try:
-                if isinstance(value, str):
-                    # Try to parse date from string format (supports multiple formats)
-                    for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d']:
-                        try:
-                            value = datetime.datetime.strptime(value, fmt).date()
-                            break
-                        except ValueError:
-                            continue
-            except Exception:
+                parsed, last_format = parse_date(value, last_format)
+                return parsed
+            except ValueError:
                 # Keep original value if parsing fails
                 pass
-                
-        elif col == 'type':
-            # Map text values to enum numbers
-            type_map = {
-                'terraced': 1,
-                'semi-detached': 2, 
-                'detached': 3, 
-                'flat': 4,
-                'other': 0
-            }
-            value = type_map.get(value.lower() if isinstance(value, str) else '', 0)
-                
-        elif col == 'is_new':
-            try:
-                # Convert to boolean integer (0 or 1)
-                if isinstance(value, str):
-                    if value.lower() in ('yes', 'true', '1', 'y'):
-                        value = 1
-                    elif value.lower() in ('no', 'false', '0', 'n'):
-                        value = 0
-                    else:
-                        value = int(bool(value))
-                else:
-                    value = int(bool(value))
-            except (ValueError, TypeError):
-                value = 0
-                
-        elif col == 'duration':
-            # Map text values to enum numbers
-            duration_map = {
-                'freehold': 1,
-                'leasehold': 2,
-                'unknown': 0
-            }
-            value = duration_map.get(value.lower() if isinstance(value, str) else '', 0)
-                
-        elif col in ('postcode1', 'postcode2'):
-            # Process postcodes to ensure they're properly formatted
-            if isinstance(value, str):
-                # Convert to uppercase and remove spaces
-                value = value.upper().strip()
-            else:
-                value = str(value)
-        
-        processed_row.append(value)
+        return value
     
-    return processed_row
+    return convert
+
+def _int_or_zero(value):
+    try:
+        # Default value for empty numeric fields
+        return int(value) if value != '' else 0
+    except (ValueError, TypeError, OverflowError):
+        # Use default value if conversion fails
+        return 0
+
+def _float_int_or_zero(value):
+    try:
+        return int(float(value)) if value != '' else 0
+    except (ValueError, TypeError, OverflowError):
+        return 0
+
+def _float_int_or_keep(value):
+    try:
+        return int(float(value)) if value != '' else 0
+    except (ValueError, TypeError, OverflowError):
+        return value
 
-def process_generic_row(row, columns):
+def _uk_type(value):
+    # Map text values to enum numbers; common casings hit the lookup directly
+    number = _UK_TYPE_LOOKUP.get(value)
+    if number is None:
+        number = UK_TYPE_MAP.get(value.lower() if isinstance(value, str) else '', 0)
+    return number
+
+def _uk_duration(value):
+    # Map text values to enum numbers; common casings hit the lookup directly
+    number = _UK_DURATION_LOOKUP.get(value)
+    if number is None:
+        number = UK_DURATION_MAP.get(value.lower() if isinstance(value, str) else '', 0)
+    return number
+
+def _case_variants(mapping):
     """
-    Generic processing for unknown table schemas
+    Extend a lower-case keyed mapping with the usual casings of each key
+    
+    Args:
+        mapping (dict): Lower-case text value to enum number
+    
+    Returns:
+        dict: The mapping keyed by lower, upper, title and capitalized variants
+    """
+    return {
+        variant: number
+        for key, number in mapping.items()
+        for variant in (key, key.upper(), key.title(), key.capitalize())
+    }
+
+_UK_TYPE_LOOKUP = _case_variants(UK_TYPE_MAP)
+_UK_DURATION_LOOKUP = _case_variants(UK_DURATION_MAP)
+
+def _flag(value):
+    # Convert to boolean integer (0 or 1)
+    if isinstance(value, str):
+        lowered = value.lower()
+        if lowered in ('yes', 'true', '1', 'y'):
+            return 1
+        if lowered in ('no', 'false', '0', 'n'):
+            return 0
+    return int(bool(value))
+
+def _postcode(value):
+    # Convert to uppercase and remove surrounding spaces
+    return value.upper().strip() if isinstance(value, str) else str(value)
+
+# Value converters per column kind for each table schema
+_ONTIME_CONVERTERS = {
+    KIND_DATE: _ontime_date,
+    KIND_INT: _int_or_zero,
+    KIND_FLOAT_INT: _float_int_or_zero,
+}
+_UK_PRICE_PAID_CONVERTERS = {
+    KIND_DATE: _date,
+    KIND_FLOAT_INT: _float_int_or_zero,
+    KIND_TYPE: _uk_type,
+    KIND_DURATION: _uk_duration,
+    KIND_FLAG: _flag,
+    KIND_POSTCODE: _postcode,
+}
+_GENERIC_CONVERTERS = {
+    KIND_DATE: _date,
+    KIND_FLOAT_INT: _float_int_or_keep,
+}
+
+def fast_ymd(value):
+    """
+    Parse a YYYY-MM-DD date without going through strptime
+    
+    Args:
+        value (str): The date string
+    
+    Returns:
+        datetime.date: The parsed date
+    
+    Raises:
+        ValueError: If the value is not a valid date in that format
+    """
+    if len(value) == 10 and value[4] == '-' and value[7] == '-':
+        year, month, day = value[0:4], value[5:7], value[8:10]
+        if year.isdigit() and month.isdigit() and day.isdigit():
+            return datetime.date(int(year), int(month), int(day))
+    # Unpadded or otherwise unusual values keep strptime's leniency
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_date(value, first_format=DATE_FORMATS[0]):
+    """
+    Parse a date in any of DATE_FORMATS, trying first_format first
+    
+    The formats use different separators or field orders, so a value matches
+    at most one of them and the order they are tried in does not change the result.
+    
+    Args:
+        value (str): The date string
+        first_format (str): Format to try before the others, usually the last one that matched
+    
+    Returns:
+        tuple: The parsed datetime.date and the format that matched
+    
+    Raises:
+        ValueError: If no format matches
+    """
+    try:
+        if first_format == '%Y-%m-%d':
+            return fast_ymd(value), first_format
+        return datetime.datetime.strptime(value, first_format).date(), first_format
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        if fmt == first_format:
+            continue
+        try:
+            return datetime.datetime.strptime(value, fmt).date(), fmt
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value}")
+
+def convert_tables(tables, converters, process_row, sort_indices=None):
+    """
+    Convert string-typed Arrow tables into Python column lists for a columnar insert
+    
+    Args:
+        tables (iterable): pyarrow.Table slices of the file, all columns as strings
+        converters (list): Per-column Arrow converters, None for unchanged columns
+        process_row (function): Row processor from make_row_processor, used as fallback
+        sort_indices (list): Positions of the columns to sort each batch by, if any
+    
+    Yields:
+        list: One list of values per column
+    """
+    pa = get_arrow()
+    pc = pa.compute
+    for table in tables:
+        try:
+            arrays = [
+                converter(column) if converter else column
+                for column, converter in zip(table.columns, converters)
+            ]
+            if sort_indices:
+                converted = pa.Table.from_arrays(arrays, names=[str(i) for i in range(len(arrays))])
+                order = pc.sort_indices(converted, sort_keys=[(str(i), 'ascending') for i in sort_indices])
+                arrays = [array.take(order) for array in arrays]
+            batch = [array.to_pylist() for array in arrays]
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, OverflowError):
+            # Some value cannot be converted in bulk (e.g. a malformed number,
+            # or a year 0 date Python has no date for); the row processors
+            # apply their per-value defaults instead
+            rows = zip(*[column.to_pylist() for column in table.columns])
+            processed = [process_row(row) for row in rows]
+            batch = [list(values) for values in zip(*processed)]
+            if sort_indices:
+                batch = sort_columns(batch, sort_indices)
+        yield batch
+
+def order_by_indices(columns, order_by):
+    """
+    Resolve the optional order_by column names to positions in the selected columns
+    
+    Args:
+        columns (list): The selected column names
+        order_by (list): Column names to sort each batch by, usually the table's primary key
+    
+    Returns:
+        list: Column positions in sort order, empty if order_by is not set
+    """
+    if not order_by:
+        return []
+    missing = [col for col in order_by if col not in columns]
+    if missing:
+        raise ValueError(f"order_by columns not selected: {', '.join(missing)}")
+    return [columns.index(col) for col in order_by]
+
+def batch_size_of(config):
+    """
+    Read the optional batch_size setting
+    
+    Args:
+        config (dict): Ingestion configuration
+    
+    Returns:
+        int: Rows per batch, BATCH_SIZE if not set
+    
+    Raises:
+        ValueError: If batch_size is not a positive integer
+    """
+    return positive_int_of(config, 'batch_size', BATCH_SIZE)
+
+def positive_int_of(config, key, default):
+    """
+    Read an optional positive integer setting
+    
+    Args:
+        config (dict): Ingestion configuration
+        key (str): Name of the setting
+        default (int): Value used if the setting is not present
+    
+    Returns:
+        int: The setting, or default if not set
+    
+    Raises:
+        ValueError: If the setting is not a positive integer
+    """
+    value = config.get(key, default)
+    # bool is a subclass of int but never a meaningful count
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"{key} must be a positive integer, got {value!r}")
+    return value
+
+def sort_columns(batch, sort_indices):
+    """
+    Sort a columnar batch so ClickHouse can skip sorting the block on insert
+    
+    Args:
+        batch (list): One list of processed values per column
+        sort_indices (list): Positions of the columns to sort by
+    
+    Returns:
+        list: The batch, sorted unless the key values are not comparable
+    """
+    keys = list(zip(*[batch[i] for i in sort_indices]))
+    try:
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+    except TypeError:
+        # Unparsed values (e.g. an empty date next to dates) cannot be ordered;
+        # the server sorts the block itself
+        return batch
+    return [[values[i] for i in order] for values in batch]
+
+def arrow_column_converters(columns, table_name):
+    """
+    Choose a vectorized converter for each column, mirroring the row processors
+    
+    Converters raise pyarrow.ArrowInvalid when a column cannot be converted
+    in bulk with the same result as the row processors.
     
     Args:
-        row (list): The row data
         columns (list): The column names
+        table_name (str): Lower-cased target table name
     
     Returns:
-        list: The processed row with basic type inference
+        list: A converter function or None (keep strings) per column
     """
-    processed_row = []
-    for i, col in enumerate(columns):
-        value = row[i]
-        
-        # Basic type inference
-        if col.lower().endswith('date'):
-            # Try to convert any date-like column
-            try:
-                if isinstance(value, str) and value:
-                    for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d']:
-                        try:
-                            value = datetime.datetime.strptime(value, fmt).date()
-                            break
-                        except ValueError:
-                            continue
-            except Exception:
-                pass
-        
-        # Attempt to convert numeric-looking columns
-        elif re.match(r'^(id|count|num|amount|price|total|sum|qty|quantity).*$', col.lower()):
-            try:
-                if value == '':
-                    value = 0
-                else:
-                    value = int(float(value))
-            except (ValueError, TypeError):
-                pass
-        
-        processed_row.append(value)
+    date_formats = ['%Y-%m-%d'] if "ontime" in table_name else DATE_FORMATS
+    converters = {
+        KIND_STR: None,
+        KIND_DATE: lambda column: _arrow_date(column, date_formats),
+        KIND_INT: _arrow_int,
+        KIND_FLOAT_INT: lambda column: _arrow_int(column, via_float=True),
+        KIND_TYPE: lambda column: _arrow_enum(column, UK_TYPE_MAP),
+        KIND_DURATION: lambda column: _arrow_enum(column, UK_DURATION_MAP),
+        KIND_FLAG: _arrow_flag,
+        KIND_POSTCODE: _arrow_postcode,
+    }
+    return [converters[kind] for kind in classify_columns(table_name, tuple(columns))]
+
+def _arrow_int(column, via_float=False):
+    """
+    Parse a string column as integers, treating empty strings as 0
+    
+    Args:
+        column (pyarrow.ChunkedArray): String column
+        via_float (bool): Parse as floats first and truncate, like int(float(value))
+    
+    Returns:
+        pyarrow.ChunkedArray: int64 column
+    """
+    pa = get_arrow()
+    pc = pa.compute
+    filled = pc.if_else(pc.equal(column, ''), '0', column)
+    pattern = ARROW_FLOAT_PATTERN if via_float else ARROW_INT_PATTERN
+    _require_all(pc.match_substring_regex(filled, pattern), "Column has values Arrow would parse differently")
+    if via_float:
+        # A safe cast rejects NaN, infinities and out-of-range values
+        return pc.cast(pc.trunc(pc.cast(filled, pa.float64())), pa.int64())
+    return pc.cast(filled, pa.int64())
+
+def _arrow_date(column, formats):
+    """
+    Parse a string column as dates using the first format that matches every value
+    
+    A format only matches if formatting the parsed dates gives back the
+    original strings; Arrow's strptime is lenient about impossible dates
+    (2020-02-30), short years and leading spaces, which the row processors
+    keep as they are.
+    
+    Args:
+        column (pyarrow.ChunkedArray): String column
+        formats (list): strptime formats to try, in order
+    
+    Returns:
+        pyarrow.ChunkedArray: date32 column
+    """
+    pa = get_arrow()
+    pc = pa.compute
+    for fmt in formats:
+        try:
+            parsed = pc.strptime(column, format=fmt, unit='s')
+        except pa.ArrowInvalid:
+            continue
+        if pc.all(pc.equal(pc.strftime(parsed, format=fmt), column)).as_py():
+            return pc.cast(parsed, pa.date32())
+    raise pa.ArrowInvalid("No single date format matches the whole column")
+
+def _arrow_postcode(column):
+    """
+    Upper-case and trim a string column, like the row processor does with str methods
+    
+    Args:
+        column (pyarrow.ChunkedArray): String column
     
-    return processed_row
\ No newline at end of file
+    Returns:
+        pyarrow.ChunkedArray: String column
+    """
+    pc = get_arrow().compute
+    # Unicode case mapping differs between Python and Arrow (e.g. 'ß')
+    _require_all(pc.string_is_ascii(column), "Column has non-ASCII values")
+    return pc.utf8_trim_whitespace(pc.utf8_upper(column))
+
+def _require_all(mask, message):
+    """
+    Raise pyarrow.ArrowInvalid unless every value of a boolean column is true
+    
+    Args:
+        mask (pyarrow.ChunkedArray): Boolean column
+        message (str): Error message
+    """
+    pa = get_arrow()
+    if not pa.compute.all(mask).as_py():
+        raise pa.ArrowInvalid(message)
+
+def _arrow_enum(column, mapping):
+    """
+    Map a string column case-insensitively onto enum numbers, defaulting to 0
+    
+    Args:
+        column (pyarrow.ChunkedArray): String column
+        mapping (dict): Lower-case text value to enum number
+    
+    Returns:
+        pyarrow.ChunkedArray: int64 column
+    """
+    pa = get_arrow()
+    pc = pa.compute
+    indices = pc.index_in(pc.utf8_lower(column), value_set=pa.array(list(mapping)))
+    return pc.fill_null(pc.take(pa.array(list(mapping.values()), pa.int64()), indices), 0)
+
+def _arrow_flag(column):
+    """
+    Convert a yes/no style string column to 0/1; other non-empty values count as 1
+    
+    Args:
+        column (pyarrow.ChunkedArray): String column
+    
+    Returns:
+        pyarrow.ChunkedArray: int64 column
+    """
+    pa = get_arrow()
+    pc = pa.compute
+    is_false = pc.or_(
+        pc.is_in(pc.utf8_lower(column), value_set=pa.array(['no', 'false', '0', 'n'])),
+        pc.equal(column, '')
+    )
+    return pc.if_else(is_false, 0, 1)
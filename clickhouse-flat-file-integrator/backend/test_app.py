@@ -0,0 +1,36 @@
+import datetime
+import json
+import unittest
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+import orjson
+
+# Import the app without monkey-patching the test process, configuring
+# logging or creating the data directory
+with mock.patch('eventlet.monkey_patch'), mock.patch('utils.configure_logging'), mock.patch('os.makedirs'):
+    import app
+
+class DumpJsonTest(unittest.TestCase):
+    values = [
+        datetime.date(2020, 1, 2),
+        datetime.datetime(2020, 1, 2, 3, 4, 5),
+        datetime.datetime(2020, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+        datetime.time(3, 4, 5),
+        Decimal('12.50'),
+        uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'straße',
+        None,
+    ]
+
+    def test_wide_integers_fall_back_to_the_stdlib_encoder(self):
+        encoded = app.dump_json([2 ** 70, -2 ** 70])
+        self.assertEqual(json.loads(encoded), [2 ** 70, -2 ** 70])
+
+    def test_fallback_formats_values_like_orjson(self):
+        expected = orjson.dumps(self.values, default=app.orjson_default)
+        self.assertEqual(app.dump_json([2 ** 70] + self.values), b'[' + str(2 ** 70).encode() + b',' + expected[1:])
+
+if __name__ == '__main__':
+    unittest.main()
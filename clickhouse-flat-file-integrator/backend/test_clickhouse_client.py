@@ -0,0 +1,122 @@
+import io
+import re
+import unittest
+from unittest import mock
+
+import clickhouse_client
+from utils import IDENTIFIER_RE
+
+class IdentifierTest(unittest.TestCase):
+    def test_matches_the_identifier_regex(self):
+        for name in ('', '`', 'a b', 'a-b', 'a\n', 'café', '١', 'a`; DROP TABLE t', '_', 'Table_1', 'uk_price_paid'):
+            self.assertEqual(clickhouse_client._is_identifier(name), IDENTIFIER_RE.match(name) is not None, repr(name))
+
+    def test_trailing_newline_is_rejected(self):
+        # The old ^...$ pattern let "name\n" through
+        self.assertIsNotNone(re.match(r'^[a-zA-Z0-9_]+$', 'name\n'))
+        self.assertFalse(clickhouse_client._is_identifier('name\n'))
+
+class CopyCsvTest(unittest.TestCase):
+    def test_counts_records_not_quoted_line_breaks(self):
+        data = b'a,b\n1,"x\ny"\n2,"said ""hi""\n"\n3,"""q"""\n4,\n'
+        for chunk_size in (1, 2, 3, 7, 1 << 20):
+            with mock.patch.object(clickhouse_client, 'HTTP_CHUNK_SIZE', chunk_size):
+                out = io.BytesIO()
+                self.assertEqual(clickhouse_client._copy_csv(io.BytesIO(data), out), 5)
+                self.assertEqual(out.getvalue(), data)
+
+    def test_empty_source(self):
+        self.assertEqual(clickhouse_client._copy_csv(io.BytesIO(b''), io.BytesIO()), 0)
+
+class FetchDataBlocksTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(clickhouse_client, 'Client')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = clickhouse_client.ClickHouseClient('localhost', 9000, 'default', 'default')
+
+    def test_rows_are_grouped_into_blocks(self):
+        rows = [(1, 'ab'), (2, 'cd'), (3, 'ef')]
+        for block_size, expected in (
+            (1, [[(1, 'ab')], [(2, 'cd')], [(3, 'ef')]]),
+            (2, [[(1, 'ab'), (2, 'cd')], [(3, 'ef')]]),
+            (5, [rows]),
+        ):
+            self.client.client.execute_iter.return_value = iter(rows)
+            blocks = self.client.fetch_data_blocks('t', ['a', 'b'], block_size)
+            self.assertEqual(list(blocks), expected)
+
+class MetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (('Client', mock.DEFAULT), ('_metadata_cache', {}), ('METADATA_CACHE_SIZE', 3)):
+            patcher = mock.patch.object(clickhouse_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = clickhouse_client.ClickHouseClient('localhost', 9000, 'default', 'default')
+        self.now = 0.0
+        patcher = mock.patch.object(clickhouse_client.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cached_tables(self):
+        return set(key[-1] for key in clickhouse_client._metadata_cache)
+
+    def test_entries_expire(self):
+        loader = mock.Mock(side_effect=[1, 2])
+        self.assertEqual(self.client._cached('columns', 'a', loader), 1)
+        self.assertEqual(self.client._cached('columns', 'a', loader), 1)
+        self.now += clickhouse_client.METADATA_TTL + 1
+        self.assertEqual(self.client._cached('columns', 'a', loader), 2)
+
+    def test_refreshing_a_key_evicts_nothing(self):
+        for table in 'abc':
+            self.client._cached('columns', table, lambda: table)
+        self.now += clickhouse_client.METADATA_TTL + 1
+        self.client._cached('columns', 'c', lambda: 'c')
+        self.assertEqual(self.cached_tables(), {'a', 'b', 'c'})
+
+    def test_refreshed_key_becomes_the_newest(self):
+        self.client._cached('columns', 'a', lambda: 'a')
+        self.client._cached('columns', 'b', lambda: 'b')
+        self.now += clickhouse_client.METADATA_TTL + 1
+        self.client._cached('columns', 'a', lambda: 'a')
+        self.client._cached('columns', 'c', lambda: 'c')
+        self.client._cached('columns', 'd', lambda: 'd')
+        self.assertEqual(self.cached_tables(), {'a', 'c', 'd'})
+
+class CheckoutClientTest(unittest.TestCase):
+    conn = {'host': 'localhost', 'port': 9000, 'database': 'default', 'user': 'default'}
+
+    def setUp(self):
+        for name, value in (('ClickHouseClient', mock.DEFAULT), ('_pool', {}), ('POOL_SIZE', 1)):
+            patcher = mock.patch.object(clickhouse_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        clickhouse_client.ClickHouseClient.side_effect = lambda **conn: mock.Mock()
+
+    def test_idle_client_is_reused(self):
+        with clickhouse_client.checkout_client(self.conn) as first:
+            pass
+        with clickhouse_client.checkout_client(self.conn) as second:
+            pass
+        self.assertIs(second, first)
+        first.disconnect.assert_not_called()
+
+    def test_clients_are_not_shared(self):
+        with clickhouse_client.checkout_client(self.conn) as first:
+            with clickhouse_client.checkout_client(self.conn) as second:
+                self.assertIsNot(second, first)
+        # Only POOL_SIZE idle clients are kept; the extra one is closed
+        first.disconnect.assert_called_once_with()
+        second.disconnect.assert_not_called()
+
+    def test_client_is_dropped_after_an_error(self):
+        with self.assertRaises(RuntimeError):
+            with clickhouse_client.checkout_client(self.conn) as failed:
+                raise RuntimeError
+        failed.disconnect.assert_called_once_with()
+        with clickhouse_client.checkout_client(self.conn) as client:
+            self.assertIsNot(client, failed)
+
+if __name__ == '__main__':
+    unittest.main()
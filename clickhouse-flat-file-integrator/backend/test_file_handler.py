@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import file_handler
+from file_handler import FileHandler
+from utils import get_arrow
+
+class ReadRowsTest(unittest.TestCase):
+    """The Arrow and csv module readers must yield the same rows"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filepath = os.path.join(directory.name, 'data.csv')
+
+    def read_both(self, text, columns):
+        with open(self.filepath, 'w', newline='', encoding='utf-8') as f:
+            f.write(text)
+        handler = FileHandler(self.filepath, ',')
+        rows = list(handler._iter_csv_rows(columns))
+        if get_arrow() is not None:
+            self.assertEqual(list(handler._iter_arrow_rows(columns)), rows)
+            tables = handler.iter_tables(columns, 2)
+            self.assertEqual([row for table in tables for row in zip(*table.to_pydict().values())], rows)
+        return rows
+
+    def test_short_rows_are_skipped(self):
+        rows = self.read_both('a,b\n1,2\n3\n4,5\n', ['a', 'b'])
+        self.assertEqual(rows, [('1', '2'), ('4', '5')])
+
+    def test_short_rows_with_the_selected_columns_are_kept(self):
+        rows = self.read_both('a,b,comment\n1,2,x\n3,4\n5,6,y\n', ['a', 'b'])
+        self.assertEqual(rows, [('1', '2'), ('3', '4'), ('5', '6')])
+
+    def test_long_rows_are_kept(self):
+        rows = self.read_both('a,b\n1,2\n3\n4,5,6\n7,8\n9\n10,11\n', ['b', 'a'])
+        self.assertEqual(rows, [('2', '1'), ('5', '4'), ('8', '7'), ('11', '10')])
+
+    def test_long_row_after_several_blocks(self):
+        lines = ['a,b,c'] + [f'{i},{i},{i}' for i in range(1, 30)]
+        lines[3] = '4,5'
+        lines[8] = ''
+        lines[12] = '"multi\nline",x,y'
+        lines[25] = '25,25,25,25'
+        text = '\n'.join(lines) + '\n'
+        expected = [(str(i),) for i in range(1, 30) if i not in (3, 8, 12)]
+        expected.insert(9, ('y',))
+        
+        with mock.patch.object(file_handler, 'ARROW_BLOCK_SIZE', 64):
+            self.assertEqual(self.read_both(text, ['c']), expected)
+
+    def test_byte_order_mark(self):
+        rows = self.read_both('\ufeffa,b\n1,2\n3,4,5\n', ['a'])
+        self.assertEqual(rows, [('1',), ('3',)])
+        handler = FileHandler(self.filepath, ',')
+        self.assertEqual(handler.get_columns(), ['a', 'b'])
+        self.assertEqual(list(handler.iter_rows(['a'])), rows)
+
+    def test_empty_file(self):
+        self.assertEqual(self.read_both('', ['a']), [])
+        self.assertEqual(list(FileHandler(self.filepath, ',').iter_rows(['a'])), [])
+
+@unittest.skipIf(get_arrow() is None, "pyarrow is not installed")
+class RecordBatchesTest(unittest.TestCase):
+    def test_values_are_kept_as_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'data.csv')
+            with open(filepath, 'w', newline='', encoding='utf-8') as f:
+                f.write('zip,amount\n01234,\n5,1.50\n')
+            batches = list(FileHandler(filepath, ',').iter_record_batches(['zip', 'amount']))
+        
+        self.assertEqual([str(field.type) for field in batches[0].schema], ['string', 'string'])
+        self.assertEqual(batches[0].to_pydict(), {'zip': ['01234', '5'], 'amount': [None, '1.50']})
+
+if __name__ == '__main__':
+    unittest.main()
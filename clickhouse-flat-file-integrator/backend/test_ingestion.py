@@ -0,0 +1,240 @@
+import csv
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from file_handler import FileHandler
+from utils import get_arrow
+import clickhouse_client
+import ingestion
+from ingestion import (BATCH_SIZE, DATE_FORMATS, arrow_column_converters, batch_size_of, convert_tables,
+                       insert_batches_parallel, make_row_processor, order_by_indices, parse_date,
+                       process_ontime_batch, sort_columns, throttled)
+
+@unittest.skipIf(get_arrow() is None, "pyarrow is not installed")
+class ArrowConversionTest(unittest.TestCase):
+    """The Arrow conversion must give the same values as the row processors"""
+
+    def assert_paths_agree(self, table_name, columns, rows):
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = os.path.join(directory, 'data.csv')
+            with open(filepath, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+
+            process_row = make_row_processor(table_name, columns)
+            expected = [process_row(row) for row in rows]
+
+            tables = FileHandler(filepath, ',').iter_tables(columns, 1000)
+            converters = arrow_column_converters(columns, table_name)
+            batches = convert_tables(tables, converters, process_row)
+            actual = [list(row) for batch in batches for row in zip(*batch)]
+
+        self.assertEqual(actual, expected)
+
+    def test_valid_values(self):
+        self.assert_paths_agree('ontime', ['FlightDate', 'Year', 'DepDelay', 'Carrier'], [
+            ['2020-01-05', '2020', '-3.00', 'AA'],
+            ['2020-12-31', '', '12.5', 'BB'],
+        ])
+
+    def test_impossible_dates(self):
+        self.assert_paths_agree('ontime', ['FlightDate'], [['2020-02-30'], ['2020-01-05']])
+        self.assert_paths_agree('uk_price_paid', ['date'], [['31/02/2020'], ['05/01/2020']])
+        self.assert_paths_agree('ontime', ['FlightDate'], [['0000-01-01'], ['2020-01-05']])
+        self.assert_paths_agree('generic', ['order_date'], [['0000-01-01'], ['2020-01-05']])
+
+    def test_loosely_formatted_dates(self):
+        self.assert_paths_agree('ontime', ['FlightDate'], [[' 2020-01-05'], ['2020-01-06']])
+        self.assert_paths_agree('ontime', ['FlightDate'], [['20-01-05'], ['2020-01-06']])
+
+    def test_hex_integers(self):
+        self.assert_paths_agree('ontime', ['Year', 'DepDelay'], [['0x1f', '0x1f'], ['2020', '1.5']])
+
+    def test_non_finite_and_spaced_numbers(self):
+        self.assert_paths_agree('uk_price_paid', ['price'], [['nan'], ['inf'], [' 100 '], ['1e3']])
+        self.assert_paths_agree('generic', ['id', 'amount'], [['nan', ' 7'], ['1', '2.5']])
+
+    def test_enums_flags_and_postcodes(self):
+        self.assert_paths_agree('uk_price_paid', ['type', 'duration', 'is_new', 'postcode1'], [
+            ['Flat', 'LEASEHOLD', 'Y', ' ab1 '],
+            ['weird', '', '', 'straße'],
+            ['DETACHED', 'freehold', 'no', 'cd2'],
+        ])
+
+class SortBatchTest(unittest.TestCase):
+    def test_order_by_indices(self):
+        self.assertEqual(order_by_indices(['a', 'b', 'c'], None), [])
+        self.assertEqual(order_by_indices(['a', 'b', 'c'], ['c', 'a']), [2, 0])
+        with self.assertRaises(ValueError):
+            order_by_indices(['a', 'b'], ['x'])
+
+    def test_sort_columns(self):
+        batch = [[2, 1, 2, 1], ['b', 'd', 'a', 'c']]
+        self.assertEqual(sort_columns(batch, [0]), [[1, 1, 2, 2], ['d', 'c', 'b', 'a']])
+        self.assertEqual(sort_columns(batch, [0, 1]), [[1, 1, 2, 2], ['c', 'd', 'a', 'b']])
+
+    def test_uncomparable_keys_are_left_unsorted(self):
+        batch = [[datetime.date(2020, 1, 2), '', datetime.date(2020, 1, 1)], [1, 2, 3]]
+        self.assertEqual(sort_columns(batch, [0]), batch)
+
+    @unittest.skipIf(get_arrow() is None, "pyarrow is not installed")
+    def test_arrow_batches_are_sorted(self):
+        pa = get_arrow()
+        columns = ['FlightDate', 'Year', 'Carrier']
+        process_row = make_row_processor('ontime', columns)
+        converters = arrow_column_converters(columns, 'ontime')
+        first, second = datetime.date(2020, 1, 1), datetime.date(2020, 1, 2)
+        for year, expected in (
+            ('2021', [[first, first, second], [2019, 2021, 2020], ['CC', 'AA', 'BB']]),
+            # A malformed number sends the table through the row processor fallback
+            ('n/a', [[first, first, second], [0, 2019, 2020], ['AA', 'CC', 'BB']]),
+        ):
+            rows = [['2020-01-02', '2020', 'BB'], ['2020-01-01', year, 'AA'], ['2020-01-01', '2019', 'CC']]
+            table = pa.table({col: [row[i] for row in rows] for i, col in enumerate(columns)})
+            self.assertEqual(list(convert_tables([table], converters, process_row, [0, 1])), [expected])
+
+class OntimeBatchTest(unittest.TestCase):
+    """The column-at-a-time ontime conversion must give the same values as the row processor"""
+
+    columns = ['FlightDate', 'Year', 'DepDelay', 'Carrier']
+
+    def assert_paths_agree(self, rows):
+        process_row = make_row_processor('ontime', self.columns)
+        expected = [list(values) for values in zip(*[process_row(row) for row in rows])]
+        self.assertEqual([list(values) for values in process_ontime_batch(rows, self.columns)], expected)
+
+    def test_valid_and_empty_values(self):
+        self.assert_paths_agree([
+            ['2020-01-05', '2020', '-3.00', 'AA'],
+            ['', '', '', ''],
+            ['2020-1-5', ' 2021 ', '1e3', 'BB'],
+        ])
+
+    def test_values_the_comprehensions_reject(self):
+        for bad_row in (
+            ['2020-02-30', '2020', '1', 'AA'],
+            ['2020-01-05', '0x1f', '1', 'AA'],
+            ['2020-01-05', '12.5', '1', 'AA'],
+            ['2020-01-05', '2020', '0x1f', 'AA'],
+            ['2020-01-05', '2020', 'inf', 'AA'],
+            ['2020-01-05', '2020', 'nan', 'AA'],
+            ['not a date', 'n/a', 'n/a', 'AA'],
+        ):
+            self.assert_paths_agree([['2020-01-06', '2019', '2.5', 'CC'], bad_row])
+
+    def test_other_columns_keep_the_fast_path(self):
+        rows = [['2020-01-05', '2020', '1', 'AA'], ['2020-01-06', '14.00', '2', 'BB']]
+        self.assert_paths_agree(rows)
+        date_converter = mock.Mock(side_effect=ingestion._ontime_date)
+        ingestion._conversion_plan.cache_clear()
+        self.addCleanup(ingestion._conversion_plan.cache_clear)
+        with mock.patch.dict(ingestion._ONTIME_CONVERTERS, {ingestion.KIND_DATE: date_converter}):
+            process_ontime_batch(rows, self.columns)
+        date_converter.assert_not_called()
+
+class ParseDateTest(unittest.TestCase):
+    values = ['2020-01-05', '2020-1-5', '05/01/2020', '5/1/2020', '2020/01/05', '2020/1/5',
+              '2020-02-30', '31/02/2020', '20-01-05', ' 2020-01-05', '01/05/20', 'junk']
+
+    @staticmethod
+    def parse_uncached(value):
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+        return None
+
+    def test_result_does_not_depend_on_the_cached_format(self):
+        for cached in DATE_FORMATS:
+            for value in self.values:
+                try:
+                    parsed = parse_date(value, cached)[0]
+                except ValueError:
+                    parsed = None
+                self.assertEqual(parsed, self.parse_uncached(value), (cached, value))
+
+    def test_each_column_remembers_its_own_format(self):
+        process_row = make_row_processor('generic', ['ship_date', 'order_date'])
+        with mock.patch.object(ingestion, 'parse_date', wraps=parse_date) as parse:
+            rows = [process_row(['2020-01-05', '05/01/2020']) for _ in range(3)]
+        self.assertEqual(rows, [[datetime.date(2020, 1, 5)] * 2] * 3)
+        self.assertEqual([call.args[1] for call in parse.call_args_list[2:]], ['%Y-%m-%d', '%d/%m/%Y'] * 2)
+
+class InsertBatchesTest(unittest.TestCase):
+    config = {'conn': {'host': 'localhost'}, 'table': 't', 'columns': ['a']}
+
+    def setUp(self):
+        for name, value in (('ClickHouseClient', mock.DEFAULT), ('_pool', {})):
+            patcher = mock.patch.object(clickhouse_client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        clickhouse_client.ClickHouseClient.side_effect = lambda **conn: mock.Mock()
+
+    def idle_clients(self):
+        return [client for idle in clickhouse_client._pool.values() for client in idle]
+
+    def test_clients_come_from_the_pool(self):
+        config = dict(self.config, insert_workers=1)
+        batches = [[[1, 2]], [[3]], [[4]]]
+        self.assertEqual(insert_batches_parallel(config, iter(batches), None), 4)
+        idle = self.idle_clients()
+        self.assertEqual(len(idle), 1)
+        
+        insert_batches_parallel(config, iter(batches), None)
+        self.assertEqual(clickhouse_client.ClickHouseClient.call_count, 1)
+        self.assertEqual(self.idle_clients(), idle)
+        idle[0].disconnect.assert_not_called()
+
+    def test_clients_are_dropped_after_a_failed_insert(self):
+        clickhouse_client.ClickHouseClient.side_effect = None
+        client = clickhouse_client.ClickHouseClient.return_value
+        client.insert_data.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            insert_batches_parallel(self.config, iter([[[1]]]), None)
+        client.disconnect.assert_called_once_with()
+        self.assertEqual(self.idle_clients(), [])
+
+class ThrottledTest(unittest.TestCase):
+    def test_same_status_is_rate_limited(self):
+        reports = []
+        now = [100.0]
+        with mock.patch.object(ingestion.time, 'monotonic', lambda: now[0]):
+            callback = throttled(lambda *args: reports.append(args), interval=1.0)
+            callback(1, 100, "inserting_data")
+            callback(2, 100, "inserting_data")
+            now[0] += 1.0
+            callback(3, 100, "inserting_data")
+        self.assertEqual(reports, [(1, 100, "inserting_data"), (3, 100, "inserting_data")])
+
+    def test_status_changes_always_go_through(self):
+        reports = []
+        with mock.patch.object(ingestion.time, 'monotonic', lambda: 100.0):
+            callback = throttled(lambda *args: reports.append(args), interval=1.0)
+            for status in ("inserting_data", "finalizing", "error"):
+                callback(50, 100, status)
+        self.assertEqual([report[2] for report in reports], ["inserting_data", "finalizing", "error"])
+
+class BatchSizeTest(unittest.TestCase):
+    def test_default_and_valid_sizes(self):
+        self.assertEqual(batch_size_of({}), BATCH_SIZE)
+        self.assertEqual(batch_size_of({'batch_size': 1000}), 1000)
+
+    def test_invalid_sizes_are_rejected(self):
+        for batch_size in (0, -1, '1000', 10.0, True, None):
+            with self.assertRaises(ValueError):
+                batch_size_of({'batch_size': batch_size})
+
+    def test_invalid_worker_counts_are_rejected(self):
+        for key in ('insert_workers', 'max_in_flight'):
+            for value in (0, -1, '4', 4.0, True, None):
+                with self.assertRaises(ValueError):
+                    insert_batches_parallel({key: value}, iter([]), None)
+        self.assertEqual(insert_batches_parallel({'insert_workers': 1, 'max_in_flight': 1}, iter([]), None), 0)
+
+if __name__ == '__main__':
+    unittest.main()
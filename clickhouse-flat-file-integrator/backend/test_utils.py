@@ -0,0 +1,22 @@
+import unittest
+
+from utils import validate_filepath
+
+class ValidateFilepathTest(unittest.TestCase):
+    def test_traversal_is_rejected(self):
+        self.assertFalse(validate_filepath('data/../../etc/passwd'))
+        self.assertFalse(validate_filepath('../data/x.csv'))
+
+    def test_dots_inside_names_are_allowed(self):
+        self.assertTrue(validate_filepath('data/my..archive.csv'))
+
+    def test_paths_outside_the_data_directory_are_rejected(self):
+        self.assertFalse(validate_filepath('other/x.csv'))
+        self.assertFalse(validate_filepath('data/../other/x.csv'))
+
+    def test_paths_are_normalized(self):
+        self.assertTrue(validate_filepath('data/a/../b.csv'))
+        self.assertTrue(validate_filepath('./data/b.csv'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,20 +1,70 @@
+import functools
 import os
 import re
 import logging
 from datetime import datetime
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("clickhouse_tool.log"),
-        logging.StreamHandler()
-    ]
-)
+# Log file written by the app, rotated once it reaches LOG_MAX_BYTES
+LOG_FILE = "clickhouse_tool.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
 
 logger = logging.getLogger("clickhouse_tool")
 
+def configure_logging():
+    """
+    Set up logging to the console and a rotating log file
+    
+    Called once by the application entry point, so importing this module
+    has no side effects; the log file is only opened on the first record.
+    """
+    # Imported here; it pulls in socket, pickle and queue, which the modules
+    # importing utils for its helpers do not need
+    import logging.handlers
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.handlers.RotatingFileHandler(
+                LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True
+            ),
+            logging.StreamHandler()
+        ]
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_arrow():
+    """
+    Import pyarrow on first use, keeping its import cost out of startup
+    
+    The csv, compute and ipc submodules are loaded too, so callers can use
+    them as attributes of the returned module.
+    
+    Returns:
+        module: pyarrow, or None if it is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.ipc
+    except ImportError:  # pyarrow is optional; fall back to the csv module
+        return None
+    return pyarrow
+
+# Identifiers accepted for ClickHouse tables and columns; \Z rather than $
+# so a trailing newline is rejected too
+IDENTIFIER_RE = re.compile(r'^[a-zA-Z0-9_]+\Z')
+
+# Relative directories files may be read from or written to; paths are
+# normalized first, so "./data/" becomes "data/" and a "../data/" prefix is
+# rejected as traversal before it could match
+ALLOWED_PATH_PREFIXES = ("data/",)
+
+# Characters stripped from filenames
+UNSAFE_FILENAME_CHARS_RE = re.compile(r'[\\/*?:"<>|]')
+
 def validate_filepath(filepath):
     """
     Validate file path for security
@@ -25,15 +75,15 @@ def validate_filepath(filepath):
     Returns:
         bool: True if valid, False otherwise
     """
-    # Check for directory traversal attempts
+    # Check for directory traversal attempts; only whole ".." segments count,
+    # so names like "my..archive.csv" are fine
     normalized_path = os.path.normpath(filepath)
-    if ".." in normalized_path:
+    if ".." in normalized_path.split(os.sep):
         logger.warning(f"Potential directory traversal attempt detected: {filepath}")
         return False
     
     # Check if it's within the allowed directories
-    allowed_prefixes = ["./data/", "data/", "../data/"]
-    if not any(normalized_path.startswith(prefix) for prefix in allowed_prefixes):
+    if not normalized_path.startswith(ALLOWED_PATH_PREFIXES):
         if not normalized_path.startswith("/"):  # Allow absolute paths for flexibility
             logger.warning(f"File path outside of allowed directories: {filepath}")
             return False
@@ -51,7 +101,7 @@ def sanitize_filename(filename):
         str: Sanitized filename
     """
     # Remove potentially dangerous characters
-    filename = re.sub(r'[\\/*?:"<>|]', '', filename)
+    filename = UNSAFE_FILENAME_CHARS_RE.sub('', filename)
     
     # Prevent directory traversal
     filename = os.path.basename(filename)
@@ -91,8 +141,7 @@ def validate_table_name(table_name):
     Returns:
         bool: True if valid, False otherwise
     """
-    pattern = r'^[a-zA-Z0-9_]+$'
-    return bool(re.match(pattern, table_name))
+    return IDENTIFIER_RE.match(table_name) is not None
 
 def validate_column_name(column_name):
     """
@@ -104,5 +153,4 @@ def validate_column_name(column_name):
     Returns:
         bool: True if valid, False otherwise
     """
-    pattern = r'^[a-zA-Z0-9_]+$'
-    return bool(re.match(pattern, column_name))
\ No newline at end of file
+    return IDENTIFIER_RE.match(column_name) is not None